@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import deque
+
+# --- Admission Control ---
+# Webhook ke saamne ek gatekeeper. Har message ka ek "cost" hota hai (PDF/Image
+# text se kaafi mehnga hai). Jab total in-flight cost full ho jaye toh naye
+# messages line me wait karte hain, aur jab andaza ho ki line ka wait SLO se
+# zyada hoga toh hum turant ek chhota sa "busy" reply bhej dete hain (load shedding).
+
+MEDIA_COSTS = {
+    "application/pdf": 6,
+    "image": 4,
+    "audio": 3,
+}
+TEXT_COST = 1
+
+BUSY_REPLY = "⏳ Abhi bahut load hai. 1 minute baad try karo."
+
+
+def media_cost(content_types) -> int:
+    """Message ka total cost (attachments ke hisaab se). Sirf text = TEXT_COST."""
+    cost = 0
+    for m_type in content_types:
+        m_type = (m_type or "").lower()
+        if m_type in MEDIA_COSTS:
+            cost += MEDIA_COSTS[m_type]
+        else:
+            cost += MEDIA_COSTS.get(m_type.split("/")[0], TEXT_COST)
+    return cost or TEXT_COST
+
+
+def form_media_types(form) -> list:
+    num_media = int(form.get('NumMedia', 0) or 0)
+    return [form.get(f'MediaContentType{i}') for i in range(num_media)]
+
+
+class AdmissionController:
+    """
+    In-flight work ko cost units me track karta hai.
+
+    - max_cost: ek saath kitna kaam chal sakta hai (sab users milake).
+    - sender_cost: ek user ka in-flight + queued cost isse upar nahi jayega,
+      taaki ek banda PDFs bhej bhej ke baaki sabko starve na kare.
+    - slo_seconds: queue me isse zyada wait hone wala ho toh darwaze pe hi shed karo.
+    - max_wait: line me zyada se zyada kitna ruko (default SLO ka aadha, kyunki
+      andar aane ke baad kaam bhi toh hona hai).
+    """
+
+    def __init__(self, max_cost: int = 16, sender_cost: int = 8, slo_seconds: float = 8.0,
+                 max_wait: float = None, alpha: float = 0.2):
+        self.max_cost = max_cost
+        self.sender_cost = sender_cost
+        self.slo_seconds = slo_seconds
+        self.max_wait = max_wait if max_wait is not None else slo_seconds / 2
+        self.alpha = alpha
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.queued_cost = 0
+        self.per_sender = {}
+        self.wait_starts = []     # line me khade requests ke start times
+        self.admitted_at = {}     # sender -> deque of admit times (hold time napne ke liye)
+        self.hold_time = None     # EWMA: ek request kitni der andar rehta hai (seconds)
+        self.queue_latency = 0.0  # EWMA of queue wait (seconds), sirf dekhne ke liye
+        self.stats = {"admitted": 0, "shed_slo": 0, "shed_sender": 0, "shed_timeout": 0}
+        self._cond = None
+
+    def _condition(self):
+        # Condition ko lazily banate hain taaki sahi event loop se bind ho
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _record_wait(self, waited: float):
+        self.queue_latency += self.alpha * (waited - self.queue_latency)
+
+    def throughput(self):
+        """Poora bhara ho toh kitne cost units / second nikalte hain. Data nahi toh None."""
+        if not self.hold_time:
+            return None
+        return self.max_cost / self.hold_time
+
+    def estimated_wait(self, cost: int) -> float:
+        """
+        Naye request ko kitna rukna padega: aage wala queued cost / throughput.
+        Ye actual waits se nahi banta, isliye timeout pe cap nahi hota.
+        """
+        ahead = self.in_flight + self.queued_cost + cost - self.max_cost
+        if ahead <= 0:
+            return 0.0
+        rate = self.throughput()
+        if not rate:
+            return 0.0  # abhi tak data nahi - timeout sambhal lega
+        return ahead / rate
+
+    def oldest_wait(self) -> float:
+        return time.monotonic() - min(self.wait_starts) if self.wait_starts else 0.0
+
+    async def acquire(self, sender: str, cost: int) -> bool:
+        """True = andar aao, False = shed (caller ko BUSY_REPLY bhejna hai)."""
+        cost = min(cost, self.max_cost)  # bahut bada message bhi akele chal sake
+
+        # 1. Fairness: ek sender apne hisse se zyada nahi le sakta
+        held = self.per_sender.get(sender, 0)
+        if held and held + cost > self.sender_cost:
+            self.stats["shed_sender"] += 1
+            return False
+
+        # 2. Early shed: andaza SLO se zyada hai, ya line ka sabse purana banda SLO cross kar chuka
+        if self.estimated_wait(cost) > self.slo_seconds or self.oldest_wait() > self.slo_seconds:
+            self.stats["shed_slo"] += 1
+            return False
+
+        cond = self._condition()
+        start = time.monotonic()
+        self.per_sender[sender] = held + cost
+        self.waiting += 1
+        self.queued_cost += cost
+        self.wait_starts.append(start)
+        admitted = False
+        try:
+            async with cond:
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self.in_flight + cost <= self.max_cost),
+                        timeout=self.max_wait,
+                    )
+                except asyncio.TimeoutError:
+                    self._record_wait(time.monotonic() - start)
+                    self.stats["shed_timeout"] += 1
+                    return False
+                self.in_flight += cost
+                self.admitted_at.setdefault(sender, deque()).append(time.monotonic())
+                admitted = True
+        finally:
+            self.waiting -= 1
+            self.queued_cost -= cost
+            self.wait_starts.remove(start)
+            if not admitted:
+                # Timeout, cancel ya koi bhi error - sender ka hissa wapas
+                self._release_sender(sender, cost)
+
+        self._record_wait(time.monotonic() - start)
+        self.stats["admitted"] += 1
+        return True
+
+    def _release_sender(self, sender: str, cost: int):
+        left = self.per_sender.get(sender, 0) - cost
+        if left > 0:
+            self.per_sender[sender] = left
+        else:
+            self.per_sender.pop(sender, None)
+
+    async def release(self, sender: str, cost: int):
+        cost = min(cost, self.max_cost)
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= cost
+            self._release_sender(sender, cost)
+            starts = self.admitted_at.get(sender)
+            if starts:
+                held = time.monotonic() - starts.popleft()
+                self.hold_time = held if self.hold_time is None else self.hold_time + self.alpha * (held - self.hold_time)
+                if not starts:
+                    del self.admitted_at[sender]
+            cond.notify_all()
+
+    def snapshot(self) -> dict:
+        rate = self.throughput()
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "queued_cost": self.queued_cost,
+            "queue_latency": round(self.queue_latency, 3),
+            "throughput": round(rate, 2) if rate else None,
+            "estimated_wait": round(self.estimated_wait(1), 3),
+            **self.stats,
+        }
@@ -0,0 +1,274 @@
+import io
+import shutil
+import struct
+import subprocess
+import sys
+import time
+import wave
+from array import array
+
+# --- Voice Note Preprocessing ---
+# Upload se pehle voice note ko chhota karo: mono 16 kHz, aage-peeche ki
+# khamoshi (silence) kaat do, aur compact encode karo. Kam bytes = jaldi
+# upload + kam audio Whisper/Gemini ko sunna padta hai.
+#
+# Backends (jo mile wahi):
+#   1. ffmpeg hai  -> decode -> mono 16k PCM -> energy VAD trim -> Opus 16 kbps
+#   2. Ogg/Opus    -> pure Python: packet size se VAD (DTX silence packets 1-3
+#                     bytes ke hote hain), stream dobara likho bina decode kiye
+#   3. WAV         -> pure Python: downmix + resample 16k + VAD trim
+#   4. baaki       -> jaisa hai waisa (passthrough)
+
+TARGET_RATE = 16000
+OPUS_RATE = 48000         # Ogg Opus granule positions hamesha 48 kHz me
+OPUS_BITRATE = "16k"
+FRAME_MS = 20
+PAD_MS = 200              # speech ke aage-peeche itna rehne do (cut na lage)
+ACTIVE_BYTES_PER_20MS = 8 # isse chhote Opus packets = silence/DTX
+VENDOR = b"ThirdEye"
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def preprocess_audio(data: bytes, content_type: str = ""):
+    """
+    (data, content_type, info). info me backend, bytes aur duration (ms)
+    pehle/baad. Kuch bhi fail ho toh original audio hi lautta hai.
+    """
+    start = time.perf_counter()
+    info = {"backend": "passthrough", "in_bytes": len(data), "in_ms": None, "out_ms": None}
+    out, out_type = data, content_type
+    try:
+        if FFMPEG:
+            out, out_type, in_ms, out_ms = _ffmpeg_pipeline(data)
+            info["backend"] = "ffmpeg"
+        elif data[:4] == b"OggS" and b"OpusHead" in data[:64]:
+            out, in_ms, out_ms = trim_ogg_opus(data)
+            out_type = "audio/ogg"
+            info["backend"] = "ogg-opus"
+        elif data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+            out, in_ms, out_ms = _wav_pipeline(data)
+            out_type = "audio/wav"
+            info["backend"] = "wav"
+        else:
+            in_ms = out_ms = None
+        info["in_ms"], info["out_ms"] = in_ms, out_ms
+    except Exception as e:
+        print(f"Audio Prep Error: {e}")
+        out, out_type, info["backend"] = data, content_type, "passthrough"
+
+    # Chhota na hua ho toh original hi bhejo
+    if len(out) >= len(data):
+        out, out_type, info["out_ms"] = data, content_type, info["in_ms"]
+    info["out_bytes"] = len(out)
+    info["prep_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return out, out_type, info
+
+
+def prepare_audio(audio: tuple) -> tuple:
+    """(data, content_type) -> chhota (data, content_type), upload ke liye tayyar."""
+    out, out_type, info = preprocess_audio(*audio)
+    print(f"🎚️ Audio prep [{info['backend']}]: {info['in_bytes']} -> {info['out_bytes']} bytes, "
+          f"{info['in_ms']} -> {info['out_ms']} ms in {info['prep_ms']} ms")
+    return out, out_type
+
+
+# --- Energy VAD (PCM) ---
+def vad_bounds(samples, rate: int = TARGET_RATE):
+    """(start, end) sample index jahan speech hai (PAD_MS padding ke saath)."""
+    frame = rate * FRAME_MS // 1000
+    energies = []
+    for i in range(0, len(samples), frame):
+        chunk = samples[i:i + frame]
+        energies.append((sum(s * s for s in chunk) / max(len(chunk), 1)) ** 0.5)
+    if not energies:
+        return 0, 0
+    noise = sorted(energies)[len(energies) // 10]
+    threshold = max(noise * 3, 200)
+    active = [i for i, e in enumerate(energies) if e > threshold]
+    if not active:
+        return 0, len(samples)  # sab silence lage toh kuch mat kaato
+    pad = PAD_MS // FRAME_MS
+    first = max(active[0] - pad, 0)
+    last = min(active[-1] + pad + 1, len(energies))
+    return first * frame, min(last * frame, len(samples))
+
+
+# --- 1. ffmpeg ---
+def _ffmpeg(args: list, data: bytes) -> bytes:
+    return subprocess.run([FFMPEG, "-hide_banner", "-loglevel", "error", *args], input=data,
+                          capture_output=True, check=True, timeout=30).stdout
+
+
+def _ffmpeg_pipeline(data: bytes):
+    pcm = _ffmpeg(["-i", "pipe:0", "-ac", "1", "-ar", str(TARGET_RATE), "-f", "s16le", "pipe:1"], data)
+    samples = array("h", pcm)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    start, end = vad_bounds(samples)
+    trimmed = samples[start:end]
+    if sys.byteorder == "big":
+        trimmed.byteswap()
+    out = _ffmpeg(["-f", "s16le", "-ar", str(TARGET_RATE), "-ac", "1", "-i", "pipe:0",
+                   "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg", "pipe:1"],
+                  trimmed.tobytes())
+    return out, "audio/ogg", len(samples) * 1000 // TARGET_RATE, (end - start) * 1000 // TARGET_RATE
+
+
+# --- 2. Ogg/Opus (pure Python) ---
+def _crc_table():
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+_CRC = _crc_table()
+
+
+def ogg_crc(data: bytes) -> int:
+    crc = 0
+    for b in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC[((crc >> 24) & 0xFF) ^ b]
+    return crc
+
+
+def read_ogg_packets(data: bytes):
+    """(serial, [packets]) - pehle logical stream ke saare packets."""
+    pos, packet, packets, serial = 0, b"", [], None
+    while pos + 27 <= len(data):
+        if data[pos:pos + 4] != b"OggS":
+            raise ValueError("Not an Ogg page")
+        page_serial = struct.unpack_from("<I", data, pos + 14)[0]
+        nsegs = data[pos + 26]
+        lacing = data[pos + 27:pos + 27 + nsegs]
+        body = pos + 27 + nsegs
+        if serial is None:
+            serial = page_serial
+        for size in lacing:
+            if page_serial == serial:
+                packet += data[body:body + size]
+                if size < 255:
+                    packets.append(packet)
+                    packet = b""
+            body += size
+        pos = body
+    return serial, packets
+
+
+def opus_samples(packet: bytes) -> int:
+    """Ek Opus packet kitne 48 kHz samples ka hai (TOC byte se)."""
+    if not packet:
+        return 0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame = (480, 960, 1920, 2880)[config % 4]       # SILK 10/20/40/60 ms
+    elif config < 16:
+        frame = (480, 960)[config % 2]                   # Hybrid 10/20 ms
+    else:
+        frame = (120, 240, 480, 960)[config % 4]         # CELT 2.5/5/10/20 ms
+    code = toc & 3
+    if code == 0:
+        count = 1
+    elif code in (1, 2):
+        count = 2
+    else:
+        count = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame * count
+
+
+def _ogg_page(serial: int, seq: int, granule: int, flags: int, packets: list) -> bytes:
+    lacing = b""
+    for p in packets:
+        lacing += b"\xff" * (len(p) // 255) + bytes([len(p) % 255])
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, flags, granule, serial, seq, 0, len(lacing))
+    page = bytearray(header + lacing + b"".join(packets))
+    struct.pack_into("<I", page, 22, ogg_crc(page))
+    return bytes(page)
+
+
+def write_ogg_opus(serial: int, head: bytes, audio: list, pre_skip: int, max_page: int = 4000) -> bytes:
+    tags = b"OpusTags" + struct.pack("<I", len(VENDOR)) + VENDOR + struct.pack("<I", 0)
+    out = [_ogg_page(serial, 0, 0, 0x02, [head]), _ogg_page(serial, 1, 0, 0, [tags])]
+    seq, granule, page, size, segs = 2, pre_skip, [], 0, 0
+    for p in audio:
+        need = len(p) // 255 + 1
+        if page and (size + len(p) > max_page or segs + need > 255):
+            out.append(_ogg_page(serial, seq, granule, 0, page))
+            seq, page, size, segs = seq + 1, [], 0, 0
+        page.append(p)
+        size += len(p)
+        segs += need
+        granule += opus_samples(p)
+    if page:
+        out.append(_ogg_page(serial, seq, granule, 0x04, page))
+    return b"".join(out)
+
+
+def trim_ogg_opus(data: bytes):
+    """Leading/trailing silence packets hatao. (data, in_ms, out_ms)"""
+    serial, packets = read_ogg_packets(data)
+    if len(packets) < 3 or not packets[0].startswith(b"OpusHead"):
+        raise ValueError("Not an Opus stream")
+    head, audio = packets[0], packets[2:]
+    pre_skip = struct.unpack_from("<H", head, 10)[0]
+
+    durations = [opus_samples(p) for p in audio]
+    active = [i for i, (p, d) in enumerate(zip(audio, durations))
+              if d and len(p) * 960 / d > ACTIVE_BYTES_PER_20MS]
+    total_ms = sum(durations) * 1000 // OPUS_RATE
+    if not active:
+        return write_ogg_opus(serial, head, audio, pre_skip), total_ms, total_ms
+
+    # PAD_MS jitne packets aage-peeche bhi rakho
+    first, last, pad = active[0], active[-1], PAD_MS * OPUS_RATE // 1000
+    while first > 0 and sum(durations[first - 1:active[0]]) <= pad:
+        first -= 1
+    while last < len(audio) - 1 and sum(durations[active[-1] + 1:last + 2]) <= pad:
+        last += 1
+    kept = audio[first:last + 1]
+    return write_ogg_opus(serial, head, kept, pre_skip), total_ms, sum(durations[first:last + 1]) * 1000 // OPUS_RATE
+
+
+# --- 3. WAV (pure Python) ---
+def _wav_pipeline(data: bytes):
+    with wave.open(io.BytesIO(data)) as w:
+        channels, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        frames = w.readframes(w.getnframes())
+    if width != 2:
+        raise ValueError("Only 16-bit WAV supported")
+    samples = array("h", frames)
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    # Downmix -> mono
+    if channels > 1:
+        samples = array("h", (sum(samples[i:i + channels]) // channels
+                              for i in range(0, len(samples), channels)))
+    # Resample -> 16 kHz (linear interpolation)
+    if rate != TARGET_RATE:
+        step = rate / TARGET_RATE
+        n = int(len(samples) / step)
+        resampled = array("h")
+        for i in range(n):
+            x = i * step
+            j = int(x)
+            nxt = samples[j + 1] if j + 1 < len(samples) else samples[j]
+            resampled.append(int(samples[j] + (nxt - samples[j]) * (x - j)))
+        samples = resampled
+
+    in_ms = len(samples) * 1000 // TARGET_RATE
+    start, end = vad_bounds(samples)
+    trimmed = samples[start:end]
+    if sys.byteorder == "big":
+        trimmed.byteswap()
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(TARGET_RATE)
+        w.writeframes(trimmed.tobytes())
+    return out.getvalue(), in_ms, (end - start) * 1000 // TARGET_RATE
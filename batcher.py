@@ -0,0 +1,126 @@
+import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# --- Micro-Batching ---
+# Load ke time bahut saare users ek jaisi chhoti LLM calls karte hain (naam
+# nikalna, do descriptions compare karna). Har call ka apna overhead hai. Ye
+# batcher kuch milliseconds tak requests jama karta hai, unhe ek batched call
+# me bhejta hai, aur har caller ko uska apna result lautata hai.
+
+
+class MicroBatcher:
+    """
+    batch_fn(items) -> results (same length, same order).
+
+    - max_batch: ek call me zyada se zyada kitne items
+    - max_wait_ms: pehla item aane ke baad baaki ke liye kitna ruko
+    - max_inflight: ek saath kitne batched calls chal sakte hain
+    """
+
+    def __init__(self, batch_fn, max_batch: int = 16, max_wait_ms: float = 10, max_inflight: int = 4,
+                 name: str = "batch"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.queue = queue.Queue()
+        self.stats = {"batches": 0, "items": 0, "errors": 0, "wait_ms": 0.0, "call_ms": 0.0}
+        self.lock = threading.Lock()
+        # Free slot milne ke baad hi collect shuru: sab calls busy hon toh items
+        # queue me jama hote rehte hain aur agla batch bada banta hai
+        self.slots = threading.Semaphore(max_inflight)
+        self.pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix=f"batch-{name}")
+        threading.Thread(target=self._worker, name=f"batcher-{name}", daemon=True).start()
+
+    def submit_async(self, item) -> Future:
+        fut = Future()
+        self.queue.put((item, fut, time.perf_counter()))
+        return fut
+
+    def submit(self, item, timeout: float = None):
+        return self.submit_async(item).result(timeout)
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        # Batched calls pool me chalti hain; slot ka intezaar collect se pehle
+        while True:
+            self.slots.acquire()
+            self.pool.submit(self._run, self._collect())
+
+    def _run(self, batch):
+        try:
+            self._call(batch)
+        finally:
+            self.slots.release()
+
+    def _call(self, batch):
+        items = [b[0] for b in batch]
+        start = time.perf_counter()
+        try:
+            results = self.batch_fn(items)
+            if len(results) != len(items):
+                raise ValueError(f"{self.name}: {len(results)} results for {len(items)} items")
+            for (_, fut, _), result in zip(batch, results):
+                fut.set_result(result)
+        except Exception as e:
+            with self.lock:
+                self.stats["errors"] += 1
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+        done = time.perf_counter()
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            self.stats["wait_ms"] += sum((start - t) * 1000 for _, _, t in batch)
+            self.stats["call_ms"] += (done - start) * 1000
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            s = dict(self.stats)
+        batches, items = s["batches"] or 1, s["items"] or 1
+        return {
+            "batches": s["batches"],
+            "items": s["items"],
+            "errors": s["errors"],
+            "avg_batch_size": round(s["items"] / batches, 2),
+            "fill_rate": round(s["items"] / (batches * self.max_batch), 3),
+            "avg_wait_ms": round(s["wait_ms"] / items, 2),
+            "avg_call_ms": round(s["call_ms"] / batches, 1),
+        }
+
+
+# --- Multi-item prompt helpers ---
+def numbered_prompt(instruction: str, items: list) -> str:
+    lines = "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    return (f"{instruction}\n\nThere are {len(items)} numbered items. Reply with ONLY a JSON array of "
+            f"exactly {len(items)} strings, one answer per item, in order.\n\n{lines}")
+
+
+def parse_json_list(text: str, count: int):
+    """LLM reply me se JSON array nikalo. Length match na ho toh None."""
+    m = re.search(r"\[.*\]", text or "", re.S)
+    if not m:
+        return None
+    try:
+        values = json.loads(m.group(0))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != count:
+        return None
+    return [str(v).strip() for v in values]
@@ -0,0 +1,36 @@
+import os
+import sys
+
+from audio_prep import preprocess_audio, read_ogg_packets
+
+# audios/ ke sample clips pe preprocessing ka benchmark - bytes aur audio kitna bacha
+UPLINK_KBPS = 256  # slow mobile/3G uplink pe upload time ka andaza
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "audios"
+    files = sorted(f for f in os.listdir(folder) if f.startswith("audio_"))
+    total_in = total_out = in_ms = out_ms = prep_ms = 0
+
+    print(f"{'file':28s} {'backend':11s} {'bytes':>13s} {'audio ms':>13s} {'prep ms':>8s}")
+    for name in files:
+        with open(os.path.join(folder, name), "rb") as f:
+            data = f.read()
+        out, _, info = preprocess_audio(data, "audio/ogg")
+        if info["backend"] == "ogg-opus":
+            read_ogg_packets(out)  # output dobara parse hona chahiye
+        total_in += info["in_bytes"]
+        total_out += info["out_bytes"]
+        in_ms += info["in_ms"] or 0
+        out_ms += info["out_ms"] or info["in_ms"] or 0
+        prep_ms += info["prep_ms"]
+        print(f"{name:28s} {info['backend']:11s} {info['in_bytes']:>6d}->{info['out_bytes']:<6d} "
+              f"{info['in_ms'] or 0:>6d}->{info['out_ms'] or 0:<6d} {info['prep_ms']:>8.2f}")
+
+    if not files:
+        sys.exit("No audio_* clips found")
+    saved = total_in - total_out
+    upload_saved = saved * 8 / UPLINK_KBPS
+    print(f"📦 Bytes: {total_in} -> {total_out} ({saved / total_in:.1%} saved)")
+    print(f"🔇 Audio: {in_ms} ms -> {out_ms} ms ({(in_ms - out_ms) / max(in_ms, 1):.1%} silence trimmed)")
+    print(f"⚡ Prep: avg {prep_ms / len(files):.2f} ms/clip, "
+          f"upload saved ~{upload_saved / len(files):.1f} ms/clip @ {UPLINK_KBPS} kbps")
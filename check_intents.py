@@ -0,0 +1,113 @@
+import time
+from collections import Counter
+
+from intents import CONFIDENCE_THRESHOLD, TRAINING, extract_name, needs_web, route, rule_only
+
+# Labelled test set (TRAINING se alag messages) - routing accuracy aur latency check
+TEST_SET = [
+    ("tag", "Ye Chintu hai"), ("tag", "ye meri mummy hai"), ("tag", "yeh hamara ghar hai"), ("tag", "iska naam Rakesh hai"),
+    ("tag", "naam rakho sheru"), ("tag", "save as passport"), ("tag", "iska naam moti hai"), ("tag", "ye dadi h"),
+    ("tag", "Bruno naam rakho"), ("tag", "call it blue bottle"),
+    ("search", "Chintu dikhao"), ("search", "baby ki photo dikhao"), ("search", "rakesh k bare me batao"),
+    ("search", "passport dikha do"), ("search", "show me sheru"), ("search", "mummy wali photo dikhao"),
+    ("search", "ghar ke baare me batao"), ("search", "find the red car"),
+    ("photo_index", "2nd pic dikhao"), ("photo_index", "3rd photo dikhao"), ("photo_index", "photo 5"),
+    ("photo_index", "1 photo"), ("photo_index", "dusri photo"), ("photo_index", "teesri tasveer dikhao"),
+    ("photo_index", "pic no 4"),
+    ("history", "purani history"), ("history", "meri history dikhao"), ("history", "recent photos"),
+    ("history", "saari photos"), ("history", "gallery kholo"),
+    ("more", "agla page"), ("more", "aage dikhao"), ("more", "next page"), ("more", "aur photos"),
+    ("reset", "/reset karo"), ("reset", "reset"), ("reset", "sab saaf kar do"), ("reset", "memory clear kardo"),
+    ("reset", "clear everything"),
+    ("web", "aaj sone ka rate kya hai?"), ("web", "delhi ka weather kaisa hai"), ("web", "latest cricket news?"),
+    ("web", "india vs pakistan match score"), ("web", "aaj petrol ka price?"), ("web", "bitcoin ka current price"),
+    ("web", "nifty aaj kitna gira?"), ("web", "election result kab aayega?"),
+    ("chat", "hi"), ("chat", "kya haal hai?"), ("chat", "thanks yaar"), ("chat", "tumhara naam kya hai?"),
+    ("chat", "ek story sunao"), ("chat", "mujhe bore ho raha hai"), ("chat", "pyaar kya hota hai?"),
+    ("chat", "good night"), ("chat", "ek shayari likho"), ("chat", "how are you?"),
+    ("chat", "photosynthesis kya hai?"), ("chat", "mujhe english sikhao"),
+    # English "this is / it's" chat hai, naam nahi (sirf pending-name reply me naam)
+    ("chat", "this is great"), ("chat", "it's ok"), ("chat", "it's raining"), ("chat", "it's been a long day"),
+    ("chat", "ok"), ("chat", "hmm"), ("chat", "haan"), ("chat", "acha"), ("chat", "bye"), ("chat", "👍"),
+]
+
+# Photo ke baad naam wala reply: (reply, local naam pe bharosa karna chahiye?)
+NAME_SET = [
+    ("Rahul", True), ("ye Chintu hai", True), ("this is Rakesh", True), ("Bruno naam rakho", True),
+    ("save as office bag", True), ("mera bhai Rahul", False), ("my dog tommy", False),
+    ("ye mera bhai hai", False), ("hamari shaadi ki photo", False), ("ye kaun hai?", False),
+]
+
+
+# voice_bot me chat fallback hai: model ke guess pe gallery output nahi aana chahiye
+CHAT_ONLY = ["ek story sunao", "tell me a joke", "5 photos bhejo", "this is great", "it's raining",
+             "koi gaana sunao", "mujhe kuch batao"]
+
+
+class CountingLLM:
+    """main.py jaisa llm fallback, par bina network: sirf calls ginta hai."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        return ""
+
+if __name__ == "__main__":
+    seen = {text.lower() for _, text in TRAINING}
+    overlap = [msg for _, msg in TEST_SET if msg.lower() in seen]
+    assert not overlap, f"TEST_SET training se alag hona chahiye: {overlap}"
+
+    correct, per_label, errors = 0, Counter(), []
+    totals = Counter(label for label, _ in TEST_SET)
+    sources = Counter()
+    latencies = []
+
+    for label, msg in TEST_SET:
+        start = time.perf_counter()
+        intent = route(msg)  # llm=None: sirf local faisla
+        latencies.append((time.perf_counter() - start) * 1000)
+        sources[intent.source] += 1
+        if intent.name == label:
+            correct += 1
+            per_label[label] += 1
+        else:
+            errors.append((msg, label, intent.name, round(intent.confidence, 2)))
+
+    print(f"✅ Accuracy: {correct}/{len(TEST_SET)} = {correct / len(TEST_SET):.1%}")
+    for label in totals:
+        print(f" - {label:12s} {per_label[label]}/{totals[label]}")
+    print(f"⚡ Latency: avg {sum(latencies) / len(latencies):.3f} ms, max {max(latencies):.3f} ms")
+    print(f"📊 Decided by: {dict(sources)}")
+    for msg, want, got, conf in errors:
+        print(f" ❌ '{msg}': expected {want}, got {got} ({conf})")
+
+    # voice_bot ka path: rule_only(route(msg))
+    leaked = [m for m in CHAT_ONLY if rule_only(route(m)).name != "chat"]
+    print(f"💬 voice_bot chat safety: {len(CHAT_ONLY) - len(leaked)}/{len(CHAT_ONLY)} stayed chat")
+    for msg in leaked:
+        print(f" ❌ '{msg}' -> {route(msg).name}")
+
+    # main.py ka asli path: needs_web(msg, llm=...) - kitne messages paid LLM call karte hain
+    llm = CountingLLM()
+    for _, msg in TEST_SET:
+        needs_web(msg, llm=llm)
+    print(f"💸 needs_web LLM fallback: {llm.calls}/{len(TEST_SET)} = {llm.calls / len(TEST_SET):.1%}")
+
+    llm = CountingLLM()
+    for _, msg in TEST_SET:
+        route(msg, llm=llm)
+    print(f"💸 route LLM fallback: {llm.calls}/{len(TEST_SET)} = {llm.calls / len(TEST_SET):.1%}")
+
+    # Naam: local high confidence sirf pakke naam pe, baaki LLM (name_batcher)
+    name_ok, to_llm = 0, 0
+    for reply, trusted in NAME_SET:
+        name, confidence = extract_name(reply)
+        local = confidence >= CONFIDENCE_THRESHOLD
+        to_llm += not local
+        if local == trusted:
+            name_ok += 1
+        else:
+            print(f" ❌ name '{reply}': got '{name}' ({confidence})")
+    print(f"🏷️ Names: {name_ok}/{len(NAME_SET)} correct, LLM fallback {to_llm}/{len(NAME_SET)} = {to_llm / len(NAME_SET):.1%}")
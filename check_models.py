@@ -2,6 +2,8 @@ import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 
+from warmup import list_gemini_models
+
 # Load Environment Variables
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -15,15 +17,12 @@ else:
         genai.configure(api_key=api_key)
         print("\n🔍 Checking Available Models via Google API...")
         
-        # List all models
-        count = 0
-        for m in genai.list_models():
-            # Sirf wo models dikhao jo Chat/Content Generation karte hain
-            if 'generateContent' in m.supported_generation_methods:
-                print(f" - {m.name}")
-                count += 1
+        # List all models (same logic jo apps ka background prober cache karta hai)
+        models = list_gemini_models(genai)
+        for name in models:
+            print(f" - {name}")
         
-        if count == 0:
+        if not models:
             print("⚠️ Koi model nahi mila. Shayad API Key mein permission issue hai.")
             
     except Exception as e:
@@ -1,17 +1,26 @@
 import os
+import uuid
 import sqlite3
-import requests
 import re
 import google.generativeai as genai
-from fastapi import FastAPI, Request, Response
+from fastapi import BackgroundTasks, FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
+from twilio.rest import Client as TwilioClient
 from twilio.twiml.messaging_response import MessagingResponse
 from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from gtts import gTTS
 from pypdf import PdfReader
 
+from audio_prep import prepare_audio
+from doc_store import DocStore, doc_hash
+from gallery import ensure_user_column
+from media import collect_media, download_all, gemini_describe_images, probe_twilio, run_concurrently
+from summarizer import LimitedModel, MapReduceSummarizer, RateLimiter
+from voice_stream import gemini_tokens, stream_to_speech
+from warmup import MODELS_TTL, ProviderProber, TTLCache, list_gemini_models
+
 # --- 1. SETUP ---
 BASE_DIR = Path(__file__).resolve().parent
 env_file = BASE_DIR / ".env"
@@ -22,10 +31,30 @@ if not api_key:
     raise ValueError("Key Missing! .env check karo.")
 genai.configure(api_key=api_key)
 
-# Model Setup
-model = genai.GenerativeModel('gemini-flash-latest')
+# Model Setup - saari Gemini calls (chat, audio, photos, summary) ek hi RPM limiter se
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 15))
+model = LimitedModel(genai.GenerativeModel('gemini-flash-latest'), RateLimiter(GEMINI_RPM))
+
+# Badi PDFs ke liye map-reduce summary. Background summary quota ka max 2/3 le
+# sakti hai, baaki users ke Q&A/audio ke liye bacha rehta hai.
+summarizer = MapReduceSummarizer(
+    lambda prompt: model.generate_content(prompt).text,
+    limiter=RateLimiter(max(GEMINI_RPM * 2 // 3, 1)),
+    max_workers=int(os.getenv("SUMMARY_WORKERS", 4)),
+)
+
+# Twilio REST (optional): summary webhook ke baad alag message me bhejne ke liye
+twilio_sid = os.getenv("TWILIO_ACCOUNT_SID")
+twilio_token = os.getenv("TWILIO_AUTH_TOKEN")
+twilio_client = TwilioClient(twilio_sid, twilio_token) if twilio_sid and twilio_token else None
+
+# Startup pe Gemini/Twilio connections garam, phir background health probes
+prober = ProviderProber(int(os.getenv("PROBE_INTERVAL", 60)))
+gemini_models = TTLCache(MODELS_TTL)
+prober.register("gemini", lambda: gemini_models.set(list_gemini_models(genai)))
+prober.register("twilio_media", probe_twilio)
 
-app = FastAPI()
+app = FastAPI(lifespan=prober.lifespan)
 
 # Folders
 IMAGES_DIR = BASE_DIR / "images"
@@ -44,12 +73,16 @@ def init_db():
     conn = sqlite3.connect(str(db_path))
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS memories
-                 (id INTEGER PRIMARY KEY, description TEXT, timestamp TEXT, filename TEXT, user_tag TEXT)''')
+                 (id INTEGER PRIMARY KEY, description TEXT, timestamp TEXT, filename TEXT, user_tag TEXT, user_id TEXT)''')
     conn.commit()
+    ensure_user_column(conn, os.getenv("LEGACY_OWNER"))  # purane rows ka owner (single-user setup)
     conn.close()
 
 init_db()
 
+# PDFs ka shared store (SHA-256 se keyed), users ke paas sirf reference
+doc_store = DocStore(BASE_DIR / "memory.db")
+
 # --- HELPER FUNCTIONS ---
 def clean_text_for_audio(text):
     clean = text.replace('*', '').replace('_', '').replace('#', '')
@@ -57,36 +90,181 @@ def clean_text_for_audio(text):
     return clean.strip()
 
 def extract_text_from_pdf(pdf_path):
+    """(text, page_count) - error pe ("", 0)."""
     try:
         reader = PdfReader(pdf_path)
         text = ""
         for page in reader.pages:
             text += page.extract_text() + "\n"
-        return text
+        return text, len(reader.pages)
     except Exception as e:
         print(f"PDF Error: {e}")
-        return ""
+        return "", 0
 
-def save_latest_doc_content(text):
-    with open(DOCS_DIR / "latest_doc_context.txt", "w", encoding="utf-8") as f:
-        f.write(text)
+# --- MEDIA PROCESSING (har ek reply text lautata hai) ---
+def save_photos(images, sender):
+    try:
+        # uuid suffix: parallel requests same second me ek dusre ki file overwrite na karein
+        stamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        filenames = [f"img_{stamp}.jpg" if len(images) == 1 else f"img_{stamp}_{i+1}.jpg"
+                     for i in range(len(images))]
+        for (img_data, _), filename in zip(images, filenames):
+            with open(IMAGES_DIR / filename, "wb") as f:
+                f.write(img_data)
+        
+        descriptions = gemini_describe_images(model, "Describe this image specifically.", images)
+        
+        conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+        c = conn.cursor()
+        time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.executemany("INSERT INTO memories (description, timestamp, filename, user_tag, user_id) VALUES (?, ?, ?, ?, ?)", 
+                      [(d, time_now, fn, None, sender) for d, fn in zip(descriptions, filenames)])
+        conn.commit()
+        conn.close()
+        if len(descriptions) == 1:
+            return f"✅ Photo Save: {descriptions[0]}"
+        return f"✅ {len(descriptions)} Photos Save:\n" + "\n".join(f"{i}. {d}" for i, d in enumerate(descriptions, 1))
+    except Exception as e:
+        print(f"Image Error: {e}")
+        return "Error saving image."
+
+def load_pdf(pdf_data):
+    """Store se document lo; naya hai toh save + extract karke store me daalo."""
+    sha = doc_hash(pdf_data)
+    doc = doc_store.get(sha)
+    if doc:
+        print(f"♻️ Known PDF {sha[:12]} (cache hit)")
+        return doc
+    # Same nayi PDF kai log ek saath bhejein toh extraction sirf ek baar
+    return doc_store.single_flight(("load", sha), lambda: store_new_pdf(sha, pdf_data))
+
+def store_new_pdf(sha, pdf_data):
+    doc = doc_store.get(sha)  # intezaar ke dauraan kisi aur ne bana diya ho
+    if doc:
+        return doc
+    # Content-addressed file: same PDF dobara disk pe nahi likhi jayegi
+    filename = f"doc_{sha[:16]}.pdf"
+    pdf_path = DOCS_DIR / filename
+    if not pdf_path.exists():
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_data)
+    text, pages = extract_text_from_pdf(pdf_path)
+    if text.strip():
+        doc_store.put(sha, text, pages, len(pdf_data), filename)
+    return {"sha256": sha, "text": text, "summary": None, "pages": pages}
+
+def can_send(bot_number):
+    return twilio_client is not None and bool(bot_number)
 
-def get_latest_doc_content():
+def send_message(sender, bot_number, text):
+    """Webhook ke bahar ek alag WhatsApp message (Twilio REST). Config nahi toh skip."""
+    if not can_send(bot_number):
+        return
     try:
-        path = DOCS_DIR / "latest_doc_context.txt"
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read()
-    except:
-        pass
-    return ""
+        # WhatsApp ek message me ~1600 chars; lamba ho toh tukdon me
+        for i in range(0, len(text), 1500):
+            twilio_client.messages.create(from_=bot_number, to=sender, body=text[i:i + 1500])
+    except Exception as e:
+        print(f"Twilio Send Error: {e}")
+
+def summarize_doc(doc, on_partial=None):
+    if doc["summary"]:
+        return doc["summary"]
+    sha = doc["sha256"]
+
+    def run():
+        done = doc_store.summary(sha)  # pichle run ne abhi abhi bana di ho
+        if done:
+            return done
+        # Pichli adhuri run ki chunk summaries bhi reuse hoti hain
+        summary, _ = summarizer.summarize(
+            doc["text"],
+            cached=doc_store.chunk_summaries(sha),
+            on_chunk=lambda i, s: doc_store.save_chunk_summary(sha, i, s),
+            on_partial=on_partial,
+        )
+        doc_store.set_summary(sha, summary)
+        return summary
+
+    # Same PDF ki summary pehle se ban rahi ho toh usi ka intezaar (map-reduce dobara nahi)
+    return doc_store.single_flight(("summary", sha), run)
+
+def ingest_pdfs(pdfs, sender):
+    """PDFs load karke user se link karo (Q&A context turant ready). Khali PDFs hata do."""
+    # Saari PDFs parallel me (sirf nayi wali extract hongi)
+    docs = [d for d in run_concurrently(load_pdf, pdfs) if d["text"].strip()]
+    if docs:
+        doc_store.link_user(sender, [d["sha256"] for d in docs])
+    return docs
+
+def summarize_pdfs(docs, sender, bot_number=None):
+    try:
+        # Summary bhi cached; sirf missing wali Gemini se banegi.
+        # Ek lambi PDF ho toh pehle part ki summary turant bhej do.
+        if len(docs) == 1:
+            on_partial = lambda s: send_message(sender, bot_number, f"📖 *Pehla hissa:*\n{s}\n\n⏳ Baaki padh raha hu...")
+            summaries = [summarize_doc(docs[0], on_partial)]
+        else:
+            summaries = run_concurrently(summarize_doc, docs)
+        if len(summaries) == 1:
+            body = summaries[0]
+        else:
+            body = "\n\n".join(f"📄 *Document {i}:*\n{s}" for i, s in enumerate(summaries, 1))
+        return f"📚 **Summary:**\n{body}\n\n👉 *Puchho sawaal iske baare mein!*"
+    except Exception as e:
+        print(f"PDF Error: {e}")
+        return "PDF error."
+
+def deliver_summary(docs, sender, bot_number):
+    """Background task: webhook ka reply ja chuka hai, summary REST se aayegi."""
+    send_message(sender, bot_number, summarize_pdfs(docs, sender, bot_number))
+
+def reply_to_audio(audios, sender):
+    print("🎤 Audio received...")
+    # Upload se pehle silence trim + compact
+    audio_parts = [{"mime_type": c_type, "data": data} for data, c_type in run_concurrently(prepare_audio, audios)]
+    
+    # Check for PDF Context
+    doc_context = doc_store.user_context(sender)
+    
+    if doc_context:
+        print("📄 PDF Context Found for Audio!")
+        prompt = f"""
+        You have a document context provided below.
+        ---
+        {doc_context[:30000]} 
+        ---
+        The user has sent an audio message. 
+        Listen to the audio and answer based on the document above.
+        If the audio is not about the document, answer normally.
+        Reply in Hinglish (Hindi+English). Keep it short.
+        """
+    else:
+        print("❌ No PDF Context.")
+        prompt = "Listen to audio. If Hindi reply Hindi, if English reply English. Keep it short."
+    if len(audio_parts) > 1:
+        prompt += "\nThe user sent several voice notes in order; answer them together in one reply."
+
+    # Jawab stream karo, har sentence ka audio saath saath banta hai
+    audio_filename = f"reply_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.mp3"
+    bot_text_reply, has_audio = stream_to_speech(gemini_tokens(model, [prompt] + audio_parts),
+                                                 AUDIO_DIR / audio_filename, clean=clean_text_for_audio, lang='hi')
+    # TTS fail hua toh bhi text jawab jayega, bas audio nahi
+    return bot_text_reply, audio_filename if has_audio else None
 
 # --- 3. WHATSAPP LOGIC ---
+@app.get("/providers")
+async def providers():
+    # Model list background probe se cached aati hai, request path pe network call nahi
+    return {"probes": prober.snapshot(), "gemini_models": gemini_models.current()}
+
 @app.post("/whatsapp")
-async def whatsapp_reply(request: Request):
+async def whatsapp_reply(request: Request, background_tasks: BackgroundTasks):
     form = await request.form()
     num_media = int(form.get('NumMedia', 0))
     msg_body = form.get('Body', '').strip()
+    sender = form.get('From')
+    bot_number = form.get('To')
     host_url = str(request.base_url)
 
     print(f"📩 New Message: {msg_body} | Media: {num_media}") # Debugging
@@ -95,101 +273,80 @@ async def whatsapp_reply(request: Request):
 
     # === A. MEDIA HANDLING ===
     if num_media > 0:
-        media_url = form.get('MediaUrl0')
-        content_type = form.get('MediaContentType0')
-        
-        # 1. PHOTO 📸
-        if 'image' in content_type:
-            try:
-                img_data = requests.get(media_url).content
-                filename = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                with open(IMAGES_DIR / filename, "wb") as f:
-                    f.write(img_data)
-                
-                image_parts = [{"mime_type": content_type, "data": img_data}]
-                ai_response = model.generate_content(["Describe this image specifically.", image_parts[0]])
-                description = ai_response.text
-                
-                conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-                c = conn.cursor()
-                time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("INSERT INTO memories (description, timestamp, filename, user_tag) VALUES (?, ?, ?, ?)", 
-                          (description, time_now, filename, None))
-                conn.commit()
-                conn.close()
-                resp.message(f"✅ Photo Save: {description}")
-            except Exception as e:
-                resp.message("Error saving image.")
-
-        # 2. AUDIO 🎙️ (WITH PDF SUPPORT)
-        elif 'audio' in content_type:
-            try:
-                print("🎤 Audio received...")
-                audio_data = requests.get(media_url).content
-                audio_part = {"mime_type": content_type, "data": audio_data}
-                
-                # Check for PDF Context
-                doc_context = get_latest_doc_content()
-                
-                if doc_context:
-                    print("📄 PDF Context Found for Audio!")
-                    prompt = f"""
-                    You have a document context provided below.
-                    ---
-                    {doc_context[:30000]} 
-                    ---
-                    The user has sent an audio message. 
-                    Listen to the audio and answer based on the document above.
-                    If the audio is not about the document, answer normally.
-                    Reply in Hinglish (Hindi+English). Keep it short.
-                    """
-                else:
-                    print("❌ No PDF Context.")
-                    prompt = "Listen to audio. If Hindi reply Hindi, if English reply English. Keep it short."
+        media = [(url, c_type) for url, c_type in collect_media(form)
+                 if 'image' in c_type or 'audio' in c_type or 'application/pdf' in c_type]
 
-                ai_response = model.generate_content([prompt, audio_part])
-                bot_text_reply = ai_response.text
-                
-                # Send Text First
-                resp.message(f"🗣️ {bot_text_reply}")
-                
-                # Create Audio Reply
-                clean_reply = clean_text_for_audio(bot_text_reply)
-                tts = gTTS(text=clean_reply, lang='hi', slow=False)
-                audio_filename = f"reply_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-                tts.save(str(AUDIO_DIR / audio_filename))
-                
-                msg2 = resp.message("")
-                msg2.media(f"{host_url}audios/{audio_filename}")
-                
-            except Exception as e:
-                print(f"Audio Error: {e}")
-                resp.message("Audio process nahi ho paya.")
-
-        # 3. PDF UPLOAD 📄
-        elif 'application/pdf' in content_type:
-            try:
-                resp.message("📄 Padh raha hu... 2 second do.")
-                pdf_data = requests.get(media_url).content
-                filename = f"doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                pdf_path = DOCS_DIR / filename
-                with open(pdf_path, "wb") as f:
-                    f.write(pdf_data)
-                
-                full_text = extract_text_from_pdf(pdf_path)
-                
-                if full_text:
-                    save_latest_doc_content(full_text)
-                    prompt = f"Summarize this document in Hinglish. Keep it concise.\n\nText:\n{full_text[:30000]}" 
-                    ai_response = model.generate_content(prompt)
-                    resp.message(f"📚 **Summary:**\n{ai_response.text}\n\n👉 *Puchho sawaal iske baare mein!*")
+        try:
+            files = await run_in_threadpool(download_all, media)
+        except Exception as e:
+            print(f"Download Error: {e}")
+            files = []
+            resp.message("Media download nahi ho paya.")
+
+        if files:
+            images = [f for f in files if 'image' in f[1]]
+            audios = [f for f in files if 'audio' in f[1]]
+            pdfs = [f[0] for f in files if 'application/pdf' in f[1]]
+
+            # PDF pehle load honi chahiye taaki audio ko naya context mile.
+            # Badi PDF ki summary minutes le sakti hai (RPM limit) - Twilio ~15s me
+            # webhook chhod deta hai, isliye REST ho toh summary background me.
+            def docs_then_audio():
+                out = {}
+                if pdfs:
+                    try:
+                        docs = ingest_pdfs(pdfs, sender)
+                    except Exception as e:
+                        print(f"PDF Error: {e}")
+                        docs, out["pdf"] = [], "PDF error."
+                    if docs and all(d["summary"] for d in docs):
+                        out["pdf"] = summarize_pdfs(docs, sender)  # sab cached, turant
+                    elif docs and can_send(bot_number):
+                        out["pdf"] = "📄 Padh raha hu... summary thodi der me aayegi. Tab tak sawaal puchh sakte ho."
+                        background_tasks.add_task(deliver_summary, docs, sender, bot_number)
+                    elif docs:
+                        # REST nahi: summary background me cache ho jayegi, webhook nahi rukega
+                        out["pdf"] = "✅ PDF Loaded. Sawaal puchho! (Summary ban rahi hai - PDF dobara bhejoge toh turant milegi.)"
+                        background_tasks.add_task(summarize_pdfs, docs, sender)
+                    else:
+                        out.setdefault("pdf", "❌ PDF khali hai.")
+                if audios:
+                    try:
+                        out["audio"] = reply_to_audio(audios, sender)
+                    except Exception as e:
+                        print(f"Audio Error: {e}")
+                        out["audio"] = None
+                return out
+
+            # Photos aur (PDF -> Audio) parallel me
+            jobs = [docs_then_audio]
+            if images: jobs.append(lambda: save_photos(images, sender))
+            results = await run_in_threadpool(run_concurrently, lambda job: job(), jobs)
+            out = results[0]
+
+            # 1. PHOTO 📸
+            if images:
+                resp.message(results[1])
+
+            # 2. PDF UPLOAD 📄
+            if pdfs:
+                resp.message(out["pdf"])
+
+            # 3. AUDIO 🎙️ (WITH PDF SUPPORT)
+            if audios:
+                if out["audio"] is None:
+                    resp.message("Audio process nahi ho paya.")
                 else:
-                    resp.message("❌ PDF khali hai.")
-            except Exception as e:
-                print(f"PDF Error: {e}")
-                resp.message("PDF error.")
+                    bot_text_reply, audio_filename = out["audio"]
 
-        else:
+                    # Send Text First
+                    resp.message(f"🗣️ {bot_text_reply}")
+                    
+                    if audio_filename:  # TTS fail hua ho toh sirf text
+                        msg2 = resp.message("")
+                        msg2.media(f"{host_url}audios/{audio_filename}")
+
+        elif not media:
             resp.message("Sirf Photo, Audio ya PDF bhejo.")
 
     # === B. TEXT HANDLING (CHAT + Q&A) ===
@@ -201,18 +358,17 @@ async def whatsapp_reply(request: Request):
             if '/reset' in msg_lower:
                  conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
                  c = conn.cursor()
-                 c.execute("DELETE FROM memories")
+                 # Sirf is user ki memories (baaki users ka data safe)
+                 c.execute("DELETE FROM memories WHERE user_id = ?", (sender,))
                  conn.commit()
                  conn.close()
-                 # Optional: Clear Document context too
-                 doc_path = DOCS_DIR / "latest_doc_context.txt"
-                 if doc_path.exists():
-                     os.remove(doc_path)
+                 # Document context bhi hatao (sirf is user ka reference, shared doc rehta hai)
+                 doc_store.unlink_user(sender)
                  resp.message("🧹 Memory aur PDF sab saaf kar diya!")
                  
             # Document Q&A Logic
             else:
-                doc_context = get_latest_doc_content()
+                doc_context = doc_store.user_context(sender, msg_body)
                 
                 if doc_context:
                     print(f"📝 Answering using PDF Context... (Query: {msg_body})")
@@ -0,0 +1,167 @@
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+from summarizer import CONTEXT_CHARS, build_context
+
+# --- Shared Document Store ---
+# PDFs ko unke bytes ke SHA-256 se pehchante hain. Ek hi circular/invoice 100
+# log forward karein toh bhi extraction aur summary sirf ek baar banegi.
+# Har user ke paas sirf document ka reference (hash) hota hai, copy nahi.
+# Ek saath aaye same PDF ke requests bhi ek hi extraction/summary ka intezaar
+# karte hain (single_flight), har request apna alag run nahi karta.
+
+
+def doc_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocStore:
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS documents
+                     (sha256 TEXT PRIMARY KEY, text TEXT, summary TEXT, pages INTEGER,
+                      size INTEGER, filename TEXT, created TEXT, hits INTEGER DEFAULT 0)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS document_chunks
+                     (sha256 TEXT, idx INTEGER, summary TEXT, PRIMARY KEY (sha256, idx))''')
+        c.execute('''CREATE TABLE IF NOT EXISTS user_documents
+                     (user_id TEXT, sha256 TEXT, linked TEXT, PRIMARY KEY (user_id, sha256))''')
+        conn.commit()
+        conn.close()
+
+    # --- Documents ---
+    # --- In-flight dedupe ---
+    def single_flight(self, key, fn):
+        """
+        Same key ka kaam pehle se chal raha ho toh uska result ka intezaar karo,
+        warna fn() chalao. Result store me save hota hai, isliye entry baad me hat jaati hai.
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if not owner:
+            return fut.result()
+        try:
+            result = fn()
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def summary(self, sha256: str):
+        """Sirf saved summary (hit count nahi badhta)."""
+        conn = self._connect()
+        row = conn.execute("SELECT summary FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def get(self, sha256: str):
+        """Document dict (text, summary, metadata) ya None. Har hit count hota hai."""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        c.execute("SELECT * FROM documents WHERE sha256 = ?", (sha256,))
+        row = c.fetchone()
+        if row:
+            c.execute("UPDATE documents SET hits = hits + 1 WHERE sha256 = ?", (sha256,))
+            conn.commit()
+        conn.close()
+        return dict(row) if row else None
+
+    def put(self, sha256: str, text: str, pages: int, size: int, filename: str):
+        conn = self._connect()
+        c = conn.cursor()
+        time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute("INSERT OR IGNORE INTO documents (sha256, text, summary, pages, size, filename, created) "
+                  "VALUES (?, ?, NULL, ?, ?, ?, ?)", (sha256, text, pages, size, filename, time_now))
+        conn.commit()
+        conn.close()
+
+    def set_summary(self, sha256: str, summary: str):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("UPDATE documents SET summary = ? WHERE sha256 = ?", (summary, sha256))
+        conn.commit()
+        conn.close()
+
+    # --- Intermediate (per-chunk) Summaries ---
+    def chunk_summaries(self, sha256: str) -> dict:
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("SELECT idx, summary FROM document_chunks WHERE sha256 = ?", (sha256,))
+        rows = dict(c.fetchall())
+        conn.close()
+        return rows
+
+    def save_chunk_summary(self, sha256: str, idx: int, summary: str):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO document_chunks (sha256, idx, summary) VALUES (?, ?, ?)",
+                  (sha256, idx, summary))
+        conn.commit()
+        conn.close()
+
+    # --- User References ---
+    def link_user(self, user_id: str, hashes: list):
+        """User ke active documents ko in hashes se replace karo."""
+        conn = self._connect()
+        c = conn.cursor()
+        time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute("DELETE FROM user_documents WHERE user_id = ?", (user_id,))
+        c.executemany("INSERT OR IGNORE INTO user_documents (user_id, sha256, linked) VALUES (?, ?, ?)",
+                      [(user_id, h, time_now) for h in hashes])
+        conn.commit()
+        conn.close()
+
+    def unlink_user(self, user_id: str):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute("DELETE FROM user_documents WHERE user_id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+
+    def user_documents(self, user_id: str) -> list:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        c.execute("SELECT d.* FROM user_documents u JOIN documents d ON d.sha256 = u.sha256 "
+                  "WHERE u.user_id = ? ORDER BY u.rowid", (user_id,))
+        rows = [dict(r) for r in c.fetchall()]
+        conn.close()
+        return rows
+
+    def user_context(self, user_id: str, question: str = "") -> str:
+        """
+        User ke saare active documents ka context (Q&A prompt ke liye). Lambe
+        documents ke liye stored summaries + sawaal se milte chunks.
+        """
+        docs = self.user_documents(user_id)
+        if not docs:
+            return ""
+        budget = CONTEXT_CHARS // len(docs)
+        contexts = []
+        for d in docs:
+            chunks = self.chunk_summaries(d["sha256"])
+            contexts.append(build_context(question, d["text"] or "", d["summary"],
+                                          [chunks[i] for i in sorted(chunks)], budget))
+        if len(contexts) == 1:
+            return contexts[0]
+        return "\n\n".join(f"=== Document {i} ===\n{c}" for i, c in enumerate(contexts, 1))
@@ -0,0 +1,313 @@
+import base64
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# --- Per-User Gallery ---
+# History/search ab har user ke apne rows pe hai aur keyset pagination se
+# chalta hai (cursor = aakhri dikhaya gaya id), OFFSET nahi - 100k rows pe bhi
+# har page ek index lookup hai. Saath me NDJSON export/import jo batches me
+# stream karta hai, poori gallery memory me load nahi hoti.
+
+PAGE_SIZE = 5
+BATCH_SIZE = 500
+COLUMNS = ["id", "description", "timestamp", "filename", "user_tag", "user_id"]
+
+
+def ensure_user_column(conn, legacy_owner: str = None):
+    """
+    Purane memory.db me user_id column + (user_id, id) index jodo. Purane rows
+    ka user_id NULL hota hai - legacy_owner diya ho toh wo unke naam ho jaate
+    hain, warna warning (CLI se `claim` karo; `export --unowned` sirf backup ke liye).
+    """
+    c = conn.cursor()
+    cols = [r[1] for r in c.execute("PRAGMA table_info(memories)")]
+    if "user_id" not in cols:
+        c.execute("ALTER TABLE memories ADD COLUMN user_id TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_memories_user ON memories (user_id, id)")
+    conn.commit()
+    if legacy_owner:
+        claim_sqlite(conn, legacy_owner)
+    unowned = c.execute("SELECT COUNT(*) FROM memories WHERE user_id IS NULL").fetchone()[0]
+    if unowned:
+        print(f"⚠️ {unowned} purani memories kisi user ki nahi hain. "
+              f"`python gallery.py claim <user_id>` ya LEGACY_OWNER set karo.")
+
+
+# --- Legacy rows (user_id se pehle wale) ---
+def claim_sqlite(conn, user_id: str) -> int:
+    """user_id NULL wale saare rows is user ke naam. Kitne rows badle, wo lautata hai."""
+    n = conn.execute("UPDATE memories SET user_id = ? WHERE user_id IS NULL", (user_id,)).rowcount
+    conn.commit()
+    return n
+
+
+def claim_mongo(collection, user_id: str) -> int:
+    # {"user_id": None} missing field wale docs ko bhi match karta hai
+    return collection.update_many({"user_id": None}, {"$set": {"user_id": user_id}}).modified_count
+
+
+def claim_memories(db_path, user_id: str, photos_collection=None) -> int:
+    conn = sqlite3.connect(str(db_path))
+    ensure_user_column(conn)
+    n = claim_sqlite(conn, user_id)
+    conn.close()
+    if photos_collection is not None:
+        n += claim_mongo(photos_collection, user_id)
+    return n
+
+
+def page_memories(conn, user_id: str, cursor: int = None, limit: int = PAGE_SIZE, query: str = None):
+    """
+    User ki memories, naye se purane. (rows, next_cursor) - next_cursor None
+    matlab aur page nahi hai. query diya ho toh naam/description pe LIKE.
+    """
+    sql = "SELECT id, description, timestamp, filename, user_tag FROM memories WHERE user_id = ?"
+    args = [user_id]
+    if cursor is not None:
+        sql += " AND id < ?"
+        args.append(cursor)
+    if query:
+        sql += " AND (user_tag LIKE ? OR description LIKE ?)"
+        args += [f"%{query}%", f"%{query}%"]
+    sql += " ORDER BY id DESC LIMIT ?"
+    args.append(limit + 1)
+
+    rows = conn.execute(sql, args).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1][0] if has_more else None
+    return rows, next_cursor
+
+
+def nth_memory(conn, user_id: str, n: int):
+    """User ki n-th sabse nayi photo (1 = latest)."""
+    return conn.execute(
+        "SELECT description, user_tag, timestamp FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (user_id, n - 1),
+    ).fetchone()
+
+
+class GalleryBrowser:
+    """
+    'aur' (next page) ke liye har user ka aakhri cursor yaad rakhta hai.
+    kind='search' ek result per page deta hai, kind='history' PAGE_SIZE.
+    """
+
+    def __init__(self, page_size: int = PAGE_SIZE):
+        self.page_size = page_size
+        self.state = {}
+
+    def page(self, conn, user_id: str, kind: str, query: str = None, cursor: int = None):
+        """(rows, has_more)"""
+        limit = 1 if kind == "search" else self.page_size
+        rows, next_cursor = page_memories(conn, user_id, cursor, limit, query)
+        if next_cursor is not None:
+            self.state[user_id] = {"kind": kind, "query": query, "cursor": next_cursor}
+        else:
+            self.state.pop(user_id, None)
+        return rows, next_cursor is not None
+
+    def next_page(self, conn, user_id: str):
+        """(kind, query, rows, has_more) ya None agar koi list khuli nahi hai."""
+        state = self.state.get(user_id)
+        if not state:
+            return None
+        rows, has_more = self.page(conn, user_id, state["kind"], state["query"], state["cursor"])
+        return state["kind"], state["query"], rows, has_more
+
+
+# --- Export / Import (NDJSON, optional gzip) ---
+def _open(path, mode: str):
+    path = str(path)
+    if path == "-":
+        return contextlib.nullcontext(sys.stdout if "w" in mode else sys.stdin)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)  # Mongo ObjectId etc.
+
+
+def iter_sqlite(conn, user_id: str, batch_size: int = BATCH_SIZE):
+    """Keyset batches me user ke rows (purane se naye). user_id None = legacy (unowned) rows."""
+    owner = "user_id IS NULL" if user_id is None else "user_id = ?"
+    owner_args = () if user_id is None else (user_id,)
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, description, timestamp, filename, user_tag, user_id FROM memories "
+            f"WHERE {owner} AND id > ? ORDER BY id LIMIT ?", (*owner_args, last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(COLUMNS, row))
+        last_id = rows[-1][0]
+
+
+def iter_mongo(collection, user_id: str, batch_size: int = BATCH_SIZE):
+    """Mongo photos bhi _id keyset se batches me (user_id None = field missing/null)."""
+    last_id = None
+    while True:
+        flt = {"user_id": user_id}
+        if last_id is not None:
+            flt["_id"] = {"$gt": last_id}
+        docs = list(collection.find(flt).sort("_id", 1).limit(batch_size))
+        if not docs:
+            return
+        yield from docs
+        last_id = docs[-1]["_id"]
+
+
+def export_memories(db_path, user_id: str, out_path, photos_collection=None, images_dir=None,
+                    batch_size: int = BATCH_SIZE) -> int:
+    """
+    User ki saari memories ek NDJSON file me (ek line = ek record). images_dir
+    diya ho toh photo bytes bhi base64 me saath jaate hain. user_id None = legacy
+    rows jinka koi owner nahi (backup; unhe kisi user ka banana ho toh `claim`). Records count lautata hai.
+    """
+    count = 0
+    conn = sqlite3.connect(str(db_path))
+    with _open(out_path, "w") as out:
+        for row in iter_sqlite(conn, user_id, batch_size):
+            record = {"source": "sqlite", **row}
+            if images_dir and row["filename"]:
+                path = Path(images_dir) / row["filename"]
+                if path.exists():
+                    record["media_b64"] = base64.b64encode(path.read_bytes()).decode("ascii")
+            out.write(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
+            count += 1
+        if photos_collection is not None:
+            for doc in iter_mongo(photos_collection, user_id, batch_size):
+                record = {"source": "mongo", **doc}
+                out.write(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
+                count += 1
+    conn.close()
+    return count
+
+
+def _restore_media(images_dir, filename: str, media_b64: str) -> str:
+    """
+    Photo bytes images_dir me likho. Same naam ki file pehle se ho aur bytes
+    alag hon toh naya naam (hash suffix) - row galat photo ki taraf point na kare.
+    Jo filename row me jaana chahiye wo lautata hai.
+    """
+    data = base64.b64decode(media_b64)
+    path = Path(images_dir) / filename
+    if path.exists() and path.read_bytes() != data:
+        path = path.with_name(f"{path.stem}_{hashlib.sha256(data).hexdigest()[:8]}{path.suffix}")
+    if not path.exists():
+        path.write_bytes(data)
+    return path.name
+
+
+# Same (user_id, filename, timestamp, description) pehle se ho toh skip -
+# import dobara chalao ya beech me toota hua resume karo, duplicate nahi banenge
+_INSERT_NEW = (
+    "INSERT INTO memories (description, timestamp, filename, user_tag, user_id) "
+    "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM memories WHERE user_id IS ? AND "
+    "filename IS ? AND timestamp IS ? AND description IS ?)"
+)
+
+
+def import_memories(db_path, in_path, user_id: str = None, photos_collection=None, images_dir=None,
+                    batch_size: int = BATCH_SIZE) -> int:
+    """
+    export_memories ki file wapas load karo, batch_size rows ek transaction me.
+    user_id diya ho toh sab records us user ke naam pe (dusre DB se migration ke
+    liye; isi DB ke legacy rows ke liye `claim` use karo, wo copy nahi banata).
+    Idempotent: jo record pehle se hai wo dobara nahi judta. Naye records ka count lautata hai.
+    """
+    added = 0
+    conn = sqlite3.connect(str(db_path))
+    ensure_user_column(conn)
+    rows, docs = [], []
+
+    def flush():
+        nonlocal added
+        if rows:
+            before = conn.total_changes
+            conn.executemany(_INSERT_NEW, [(d, ts, fn, tag, owner, owner, fn, ts, d) for d, ts, fn, tag, owner in rows])
+            conn.commit()
+            added += conn.total_changes - before
+            rows.clear()
+        if docs:
+            from pymongo import UpdateOne
+            ops = [UpdateOne({k: doc[k] for k in ("user_id", "description", "timestamp")},
+                             {"$setOnInsert": doc}, upsert=True) for doc in docs]
+            added += photos_collection.bulk_write(ops, ordered=False).upserted_count
+            docs.clear()
+
+    with _open(in_path, "r") as src:
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            owner = user_id or record.get("user_id")
+            if record.get("source") == "mongo":
+                if photos_collection is None:
+                    continue
+                ts = record.get("timestamp")
+                docs.append({
+                    "user_id": owner, "description": record.get("description"),
+                    "name_tag": record.get("name_tag"),
+                    "timestamp": datetime.fromisoformat(ts) if ts else None,
+                })
+            else:
+                filename = record.get("filename")
+                if record.get("media_b64") and images_dir and filename:
+                    filename = _restore_media(images_dir, filename, record["media_b64"])
+                rows.append((record.get("description"), record.get("timestamp"), filename,
+                             record.get("user_tag"), owner))
+            if len(rows) + len(docs) >= batch_size:
+                flush()
+    flush()
+    conn.close()
+    return added
+
+
+if __name__ == "__main__":
+    # Usage:
+    #   python gallery.py export <user_id> <file.ndjson[.gz]> [--media]
+    #   python gallery.py export --unowned <file.ndjson[.gz]> [--media]   (legacy rows ka backup, user_id NULL)
+    #   python gallery.py import <file.ndjson[.gz]> [user_id] [--media]
+    #   python gallery.py claim <user_id>                                 (legacy rows is user ke naam)
+    from dotenv import load_dotenv
+
+    BASE_DIR = Path(__file__).resolve().parent
+    load_dotenv(dotenv_path=BASE_DIR / ".env")
+    args = [a for a in sys.argv[1:] if a not in ("--media", "--unowned")]
+    images_dir = BASE_DIR / "images" if "--media" in sys.argv else None
+
+    collection = None
+    if os.getenv("MONGO_URI"):
+        from pymongo import MongoClient
+        collection = MongoClient(os.getenv("MONGO_URI"), tls=True, tlsAllowInvalidCertificates=True).thirdeye_db.photos
+
+    if "--unowned" in sys.argv and len(args) >= 2 and args[0] == "export":
+        n = export_memories(BASE_DIR / "memory.db", None, args[1], collection, images_dir)
+        print(f"✅ {n} unowned records exported.", file=sys.stderr)
+    elif len(args) >= 3 and args[0] == "export":
+        n = export_memories(BASE_DIR / "memory.db", args[1], args[2], collection, images_dir)
+        print(f"✅ {n} records exported.", file=sys.stderr)
+    elif len(args) >= 2 and args[0] == "claim":
+        n = claim_memories(BASE_DIR / "memory.db", args[1], collection)
+        print(f"✅ {n} legacy records assigned to {args[1]}.", file=sys.stderr)
+    elif len(args) >= 2 and args[0] == "import":
+        n = import_memories(BASE_DIR / "memory.db", args[1], args[2] if len(args) > 2 else None,
+                            collection, images_dir)
+        print(f"✅ {n} new records imported (pehle se maujood skip).", file=sys.stderr)
+    else:
+        print("Usage: python gallery.py export <user_id>|--unowned <file> [--media] | "
+              "import <file> [user_id] [--media] | claim <user_id>", file=sys.stderr)
@@ -1,6 +1,6 @@
 import os
+import uuid
 import sqlite3
-import requests
 import google.generativeai as genai
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
@@ -9,6 +9,11 @@ from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
 
+from gallery import GalleryBrowser, ensure_user_column, nth_memory
+from intents import route
+from media import collect_media, download_all, gemini_describe_images, probe_twilio
+from warmup import MODELS_TTL, ProviderProber, TTLCache, list_gemini_models
+
 # --- 1. SETUP & CONFIGURATION ---
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -22,7 +27,13 @@ genai.configure(api_key=api_key)
 
 model = genai.GenerativeModel('gemini-flash-latest')
 
-app = FastAPI()
+# Startup pe Gemini/Twilio connections garam, phir background health probes
+prober = ProviderProber(int(os.getenv("PROBE_INTERVAL", 60)))
+gemini_models = TTLCache(MODELS_TTL)
+prober.register("gemini", lambda: gemini_models.set(list_gemini_models(genai)))
+prober.register("twilio_media", probe_twilio)
+
+app = FastAPI(lifespan=prober.lifespan)
 
 # Images folder banao agar nahi hai
 IMAGES_DIR = BASE_DIR / "images"
@@ -43,14 +54,46 @@ def init_db():
                   description TEXT, 
                   timestamp TEXT, 
                   filename TEXT, 
-                  user_tag TEXT)''')
+                  user_tag TEXT,
+                  user_id TEXT)''')
     conn.commit()
+    # Purani DB me user_id column nahi tha
+    ensure_user_column(conn, os.getenv("LEGACY_OWNER"))  # purane rows ka owner (single-user setup)
     conn.close()
 
 init_db()
 
+# --- GALLERY BROWSING ---
+# Har user ki apni gallery, page by page ('aur' likhne pe agla page)
+browser = GalleryBrowser()
+
+def format_page(kind, query, rows, has_more, first=True):
+    if kind == "search":
+        if not rows:
+            return f"❌ '{query}' naam ki koi photo nahi mili."
+        _, desc, time, fname, tag = rows[0]
+        txt = f"🖼️ **Photo Mil Gayi!**\n🏷️ **Naam:** {tag}\n📅 **Date:** {time}\n📝 **Description:** {desc}"
+        if has_more:
+            txt += "\n\n👉 Aur photos bhi match hui hain. 'aur' likho."
+        return txt
+
+    if not rows:
+        return "Abhi history me koi photo nahi hai."
+    txt = "📚 **Recent Photos:**\n" if first else "📚 **Aur Photos:**\n"
+    for _, desc, _, _, tag in rows:
+        name = tag if tag else "Unknown"
+        txt += f"• {name} - {desc[:30]}...\n"
+    if has_more:
+        txt += "\n👉 Agli photos ke liye 'aur' likho."
+    return txt
+
 # --- 3. WHATSAPP LOGIC ---
 
+@app.get("/providers")
+async def providers():
+    # Model list background probe se cached aati hai, request path pe network call nahi
+    return {"probes": prober.snapshot(), "gemini_models": gemini_models.current()}
+
 @app.post("/whatsapp")
 async def whatsapp_reply(request: Request):
     form = await request.form()
@@ -67,38 +110,42 @@ async def whatsapp_reply(request: Request):
 
     # === SCENARIO A: PHOTO AAYI HAI ===
     if num_media > 0:
-        media_url = form.get('MediaUrl0')
-        content_type = form.get('MediaContentType0')
+        media = [(url, c_type) for url, c_type in collect_media(form) if 'image' in c_type]
 
-        if 'image' in content_type:
+        if media:
             try:
-                # 1. Image Download & Save Locally
-                img_data = requests.get(media_url).content
+                # 1. Saari Images parallel me Download & Save Locally
+                images = download_all(media)
                 
-                # File ka naam banao (Timestamp ke sath)
-                filename = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                file_path = IMAGES_DIR / filename
+                # File ka naam banao (Timestamp + index ke sath, ek message me kai photos ho sakti hain)
+                # uuid suffix: parallel requests same second me ek dusre ki file overwrite na karein
+                stamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+                filenames = [f"img_{stamp}.jpg" if len(images) == 1 else f"img_{stamp}_{i+1}.jpg"
+                             for i in range(len(images))]
                 
-                with open(file_path, "wb") as f:
-                    f.write(img_data)
+                for (img_data, _), filename in zip(images, filenames):
+                    with open(IMAGES_DIR / filename, "wb") as f:
+                        f.write(img_data)
                 
-                # 2. Gemini Analysis
-                image_parts = [{"mime_type": content_type, "data": img_data}]
+                # 2. Gemini Analysis (saari photos ek hi call me)
                 prompt = "Describe this image in short detail. Focus on visual features."
-                ai_response = model.generate_content([prompt, image_parts[0]])
-                description = ai_response.text
+                descriptions = gemini_describe_images(model, prompt, images)
                 
                 # 3. Save to DB (Naam abhi NULL hai)
                 conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
                 c = conn.cursor()
                 time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 
-                c.execute("INSERT INTO memories (description, timestamp, filename, user_tag) VALUES (?, ?, ?, ?)", 
-                          (description, time_now, filename, None))
+                c.executemany("INSERT INTO memories (description, timestamp, filename, user_tag, user_id) VALUES (?, ?, ?, ?, ?)", 
+                              [(d, time_now, fn, None, sender) for d, fn in zip(descriptions, filenames)])
                 conn.commit()
                 conn.close()
 
-                reply.body(f"✅ Photo save ho gayi!\n🔍 **Gemini:** {description}\n\n👉 **Ise naam dene ke liye likho:**\n'Ye [Naam] hai' (Jaise: 'Ye Chintu hai')")
+                if len(descriptions) == 1:
+                    reply.body(f"✅ Photo save ho gayi!\n🔍 **Gemini:** {descriptions[0]}\n\n👉 **Ise naam dene ke liye likho:**\n'Ye [Naam] hai' (Jaise: 'Ye Chintu hai')")
+                else:
+                    lines = "\n".join(f"{i}. {d}" for i, d in enumerate(descriptions, 1))
+                    reply.body(f"✅ {len(descriptions)} Photos save ho gayi!\n🔍 **Gemini:**\n{lines}\n\n👉 **Naam dene ke liye likho:**\n'Ye [Naam] hai' (Aakhri photo ko naam milega)")
 
             except Exception as e:
                 print(f"Error: {e}")
@@ -108,18 +155,19 @@ async def whatsapp_reply(request: Request):
 
     # === SCENARIO B: TEXT MESSAGE ===
     else:
-        msg_lower = msg_body.lower()
+        # Local intent router (rules + chhota model), LLM call nahi
+        intent = route(msg_body)
 
         # 1. NAME TAGGING: "Ye [Name] hai"
-        if msg_lower.startswith("ye ") and msg_lower.endswith(" hai"):
-            # Naam nikalo (Ye aur Hai ke beech ka text)
-            name_tag = msg_body[3:-4].strip() # Case sensitive rakhna hai (Rakesh vs rakesh)
+        if intent.name == "tag":
+            # Naam router ne nikala (Case sensitive rehta hai: Rakesh vs rakesh)
+            name_tag = intent.slots["name"]
             
             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
             c = conn.cursor()
             
-            # Latest photo dhundo jiska naam abhi set nahi hai
-            c.execute("SELECT id FROM memories ORDER BY id DESC LIMIT 1")
+            # Is user ki latest photo dhundo
+            c.execute("SELECT id FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT 1", (sender,))
             row = c.fetchone()
             
             if row:
@@ -132,70 +180,50 @@ async def whatsapp_reply(request: Request):
             conn.close()
 
         # 2. SEARCH BY NAME: "[Name] dikhao"
-        elif "dikhao" in msg_lower or "batao" in msg_lower:
-            # Naam guess karo (msg me se 'dikhao' hata do)
-            search_name = msg_lower.replace("dikhao", "").replace("batao", "").replace("k bare me", "").strip()
-            
-            conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-            c = conn.cursor()
+        elif intent.name == "search":
+            search_name = intent.slots["query"]
             
             # Naam se dhundo (Partial match, jaise 'baby' search karne pe 'Cute Baby' mile)
-            c.execute("SELECT description, filename, timestamp, user_tag FROM memories WHERE user_tag LIKE ? OR description LIKE ? ORDER BY id DESC LIMIT 1", 
-                      (f'%{search_name}%', f'%{search_name}%'))
-            row = c.fetchone()
+            conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+            rows, has_more = browser.page(conn, sender, "search", query=search_name)
+            reply.body(format_page("search", search_name, rows, has_more))
             conn.close()
-
-            if row:
-                desc, fname, time, tag = row
-                
-                # Image wapas bhejne ki koshish (Localhost pe ye shayad fail ho)
-                img_link = f"{host_url}images/{fname}"
-                
-                reply_text = f"🖼️ **Photo Mil Gayi!**\n🏷️ **Naam:** {tag}\n📅 **Date:** {time}\n📝 **Description:** {desc}"
-                
-                reply.body(reply_text)
-                
-                # NOTE: Ye line tab chalegi jab hum Server par honge
-                # reply.media(img_link) 
-            else:
-                reply.body(f"❌ '{search_name}' naam ki koi photo nahi mili.")
+            
+            # NOTE: Photo wapas bhejna tab chalega jab hum Server par honge
+            # reply.media(f"{host_url}images/{fname}")
 
         # 3. SPECIFIC HISTORY: "2nd photo"
-        elif "photo" in msg_lower and any(char.isdigit() for char in msg_lower):
-             # Number nikalo string se
-             import re
-             nums = re.findall(r'\d+', msg_lower)
-             if nums:
-                 idx = int(nums[0]) - 1 # User bolega 1, hum lenge 0
-                 
-                 conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-                 c = conn.cursor()
-                 c.execute("SELECT description, user_tag, timestamp FROM memories ORDER BY id DESC LIMIT 5")
-                 rows = c.fetchall()
-                 conn.close()
-                 
-                 if 0 <= idx < len(rows):
-                     r = rows[idx]
-                     tag_display = r[1] if r[1] else "No Name"
-                     reply.body(f"📸 **Photo #{idx+1}:**\n🏷️ {tag_display}\n📝 {r[0]}")
-                 else:
-                     reply.body("Itni photos toh abhi history me nahi hain.")
-
-        # 4. NORMAL HISTORY
-        elif 'history' in msg_lower:
+        elif intent.name == "photo_index":
+             idx = intent.slots["index"] # User bolega 1 = latest
+             
+             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+             r = nth_memory(conn, sender, idx) if idx > 0 else None
+             conn.close()
+             
+             if r:
+                 tag_display = r[1] if r[1] else "No Name"
+                 reply.body(f"📸 **Photo #{idx}:**\n🏷️ {tag_display}\n📝 {r[0]}")
+             else:
+                 reply.body("Itni photos toh abhi history me nahi hain.")
+
+        # 4. NORMAL HISTORY (page by page)
+        elif intent.name == "history":
             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-            c = conn.cursor()
-            c.execute("SELECT description, user_tag FROM memories ORDER BY id DESC LIMIT 5")
-            rows = c.fetchall()
+            rows, has_more = browser.page(conn, sender, "history")
+            reply.body(format_page("history", None, rows, has_more))
             conn.close()
-            
-            txt = "📚 **Recent Photos:**\n"
-            for i, r in enumerate(rows):
-                name = r[1] if r[1] else "Unknown"
-                txt += f"{i+1}. {name} - {r[0][:30]}...\n"
-            reply.body(txt)
 
-        elif '/reset' in msg_lower:
+        # 5. NEXT PAGE: "aur"
+        elif intent.name == "more":
+            conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+            page = browser.next_page(conn, sender)
+            conn.close()
+            if page:
+                reply.body(format_page(*page, first=False))
+            else:
+                reply.body("Aur kuch nahi hai. 'history' likho.")
+
+        elif intent.name == "reset":
              # Database saaf
              pass # (Purana code use kar lena agar chahiye)
 
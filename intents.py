@@ -0,0 +1,261 @@
+import math
+import re
+from collections import Counter, defaultdict, namedtuple
+
+# --- Local Intent Router ---
+# Har chhoti baat ke liye LLM ko call karna (naam nikalna, web chahiye ya
+# nahi) slow aur mehnga hai. Pehle regex rules (Hinglish samajhte hain), phir
+# ek chhota Naive Bayes model, aur sirf jab confidence kam ho tab LLM.
+
+Intent = namedtuple("Intent", "name slots confidence source")
+
+INTENTS = ["tag", "search", "photo_index", "history", "more", "reset", "web", "chat"]
+CONFIDENCE_THRESHOLD = 0.6
+# Ye actions data badalte hain - sirf pakke rule match pe, model ke guess pe nahi
+RULE_ONLY = {"tag", "reset", "more"}
+
+# --- 1. Rules ---
+FILLER = r"(?:na|zara|please|plz|pls|mujhe|muje|meri|mera|mere|wali|wala|vali|ki|ka|ke|ko|photo|pic|image|tasveer)"
+RULES = [
+    ("reset", re.compile(r"^\s*/?reset\b|\b(sab|memory|history)\s+(saaf|clear|delete|mita)|\bclear\s+(all|memory|everything)\b", re.I)),
+    ("more", re.compile(r"^\s*(?:more|next|next\s+page|aur|aur\s+(?:dikhao|photos|batao)|aage|aage\s+dikhao|agla\s+page|agli)\s*[.!?]*\s*$", re.I)),
+    ("tag", re.compile(r"^\s*(?:ye|yeh|ya|ye\s+to|iska\s+naam|is\s+ka\s+naam)\s+(?P<name>.+?)\s+(?:hai|he|h|hain)\s*[.!]*\s*$", re.I)),
+    ("tag", re.compile(r"^\s*(?:save\s+(?:it\s+)?as|name\s+it|call\s+it|naam\s+rakho|naam\s+do)\s+(?P<name>.+?)\s*[.!]*\s*$", re.I)),
+    ("tag", re.compile(r"^\s*(?P<name>.+?)\s+naam\s+(?:rakho|rakh\s+do|save\s+karo|do)\s*[.!]*\s*$", re.I)),
+    ("photo_index", re.compile(r"(?P<index>\d+)\s*(?:st|nd|rd|th|wi|vi|va|vi)?\s*(?:photo|pic|image|tasveer|foto)\b", re.I)),
+    ("photo_index", re.compile(r"\b(?P<ordinal>pehli|pahli|first|dusri|doosri|second|teesri|tisri|third|chauthi|fourth|paanchvi|panchvi|fifth)\s+(?:photo|pic|image|tasveer|foto)\b", re.I)),
+    ("photo_index", re.compile(r"\b(?:photo|pic|image|tasveer|foto)\s*(?:no\.?|number|#)?\s*(?P<index>\d+)\b", re.I)),
+    ("history", re.compile(r"\bhistory\b|\b(?:recent|purani|pichli|saari|sari|sab)\s+(?:photos|pics|images|tasveer)\b|\bgallery\b", re.I)),
+    ("search", re.compile(rf"^\s*(?P<query>.+?)\s+(?:{FILLER}\s+)*(?:dikhao|dikha\s+do|dikhana|batao|bata\s+do|k\s+bare\s+me(?:\s+batao)?|ke\s+baare\s+(?:me|mein)(?:\s+batao)?)\s*[?.!]*\s*$", re.I)),
+    ("search", re.compile(r"^\s*(?:show\s+me|find|search(?:\s+for)?|dikhao)\s+(?P<query>.+?)\s*[?.!]*\s*$", re.I)),
+]
+
+# "this is X" / "it's X" normal English chat bhi hai ("it's raining") - isliye
+# route() me nahi, sirf photo ke baad naam wale reply (extract_name) me
+NAME_REPLY = re.compile(r"^\s*(?:this\s+is|it'?s)\s+(?P<name>.+?)\s*[.!]*\s*$", re.I)
+
+# Live info chahiye? (aaj, rate, news ...)
+WEB_HINTS = re.compile(
+    r"\b(aaj|aj|today|abhi|current|latest|live|news|khabar|weather|mausam|temperature|rate|price|"
+    r"bhav|daam|score|match|stock|share|sensex|nifty|election|result|kab\s+hai|kal\s+ka|2024|2025|2026)\b",
+    re.I,
+)
+
+ORDINALS = {"pehli": 1, "pahli": 1, "first": 1, "dusri": 2, "doosri": 2, "second": 2, "teesri": 3,
+            "tisri": 3, "third": 3, "chauthi": 4, "fourth": 4, "paanchvi": 5, "panchvi": 5, "fifth": 5}
+QUESTION_WORDS = {"kya", "kaun", "kon", "kaisa", "kaisi", "kitna", "kitni", "kahan", "kyu", "kyun", "what", "who", "how"}
+
+NOT_A_QUERY = {"kuch", "kuchh", "kuchbhi", "something", "anything", "joke", "jokes", "story", "kahani", "gaana",
+               "song", "apne", "apna", "tum", "aap", "tumhare", "aapke", "sab", "aur", "me", "a"}
+
+NAME_STOPWORDS = {"ye", "yeh", "hai", "he", "h", "this", "is", "its", "it's", "my", "mera", "meri", "mere",
+                  "naam", "name", "save", "as", "it", "call", "rakho", "do", "ka", "ki", "ke", "the", "a",
+                  "our", "hamara", "hamari", "tera", "teri", "apna", "apni", "wala", "wali"}
+
+
+# --- 2. Lightweight Model (Naive Bayes, word + char n-grams) ---
+TRAINING = [
+    ("tag", "ye rahul hai"), ("tag", "yeh meri car hai"), ("tag", "this is mom"), ("tag", "ye chintu h"),
+    ("tag", "naam rakho tommy"), ("tag", "save as office bag"), ("tag", "ye mera dost aman hai"),
+    ("tag", "iska naam bruno hai"), ("tag", "papa"), ("tag", "meri behen priya"), ("tag", "call it rocky"),
+    ("search", "rahul ki photo dikhao"), ("search", "car dikhao"), ("search", "mom ke bare me batao"),
+    ("search", "show me the dog"), ("search", "find beach photos"), ("search", "tommy wali pic dikha do"),
+    ("search", "chintu k bare me batao"), ("search", "bike ki photo batao"),
+    ("photo_index", "2nd photo"), ("photo_index", "3 photo dikhao"), ("photo_index", "photo 4"),
+    ("photo_index", "pehli photo"), ("photo_index", "1st pic"), ("photo_index", "5vi tasveer"),
+    ("history", "history"), ("history", "purani photos"), ("history", "recent photos dikhao"),
+    ("history", "meri gallery"), ("history", "sab photos ki list"), ("history", "show my history"),
+    ("more", "aur"), ("more", "aage"), ("more", "next"), ("more", "aur dikhao"), ("more", "more"),
+    ("reset", "/reset"), ("reset", "sab saaf karo"), ("reset", "memory clear karo"), ("reset", "reset everything"),
+    ("reset", "sab mita do"), ("reset", "delete all data"),
+    ("web", "aaj ka mausam kaisa hai?"), ("web", "gold rate today?"), ("web", "latest news batao"),
+    ("web", "india ka match score kya hai?"), ("web", "bangalore weather"), ("web", "petrol ka bhav kya hai"),
+    ("web", "who won the election?"), ("web", "sensex kitna hai aaj?"), ("web", "current dollar price"),
+    ("web", "kal ka result kab aayega?"),
+    ("chat", "hello"), ("chat", "kaise ho?"), ("chat", "thank you"), ("chat", "tum kaun ho?"),
+    ("chat", "ek joke sunao"), ("chat", "mujhe neend nahi aa rahi"), ("chat", "python kya hai?"),
+    ("chat", "shukriya bhai"), ("chat", "good morning"), ("chat", "ek kavita likho"),
+    ("chat", "what can you do?"), ("chat", "mera mood kharab hai"), ("chat", "kya chal raha hai?"),
+    ("chat", "zindagi kya hai?"), ("chat", "gravity kya hoti hai?"), ("chat", "mujhe coding sikhna hai"),
+    ("chat", "dosti ka matlab kya hai?"), ("chat", "mujhe motivate karo"),
+]
+
+
+def features(text: str) -> list:
+    text = text.lower().strip()
+    words = re.findall(r"[\w/']+", text)
+    feats = [f"w:{w}" for w in words]
+    feats += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    if "?" in text:
+        feats.append("has:?")
+    if re.search(r"\d", text):
+        feats.append("has:digit")
+    return feats
+
+
+class NaiveBayes:
+    def __init__(self, examples):
+        self.class_counts = Counter()
+        self.feat_counts = defaultdict(Counter)
+        self.totals = Counter()
+        vocab = set()
+        for label, text in examples:
+            self.class_counts[label] += 1
+            for f in features(text):
+                self.feat_counts[label][f] += 1
+                self.totals[label] += 1
+                vocab.add(f)
+        self.vocab_size = len(vocab)
+        self.n = sum(self.class_counts.values())
+
+    def predict(self, text: str):
+        """(label, probability)"""
+        feats = features(text)
+        scores = {}
+        for label in self.class_counts:
+            score = math.log(self.class_counts[label] / self.n)
+            denom = self.totals[label] + self.vocab_size
+            for f in feats:
+                score += math.log((self.feat_counts[label][f] + 1) / denom)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax se probability (confidence ke liye)
+        top = scores[best]
+        z = sum(math.exp(s - top) for s in scores.values())
+        return best, 1.0 / z
+
+
+_model = NaiveBayes(TRAINING)
+
+
+# --- 3. Public API ---
+def clean_slot(text: str) -> str:
+    text = re.sub(rf"\b{FILLER}\b", " ", text, flags=re.I)
+    return re.sub(r"\s+", " ", text).strip(" ?.!'\"")
+
+
+def _model_intent(text: str, label: str, prob: float, source: str) -> Intent:
+    # Model sirf label deta hai; slots rules jaisa hi text se bharo
+    slots = {}
+    if label in RULE_ONLY:
+        return Intent("chat", {}, prob, source)
+    if label == "search":
+        slots["query"] = clean_slot(re.sub(r"\b(dikhao|dikha do|batao|bata do|show me|find)\b", " ", text, flags=re.I))
+    elif label == "photo_index":
+        nums = re.findall(r"\d+", text)
+        if not nums:
+            return Intent("history", {}, prob, source)
+        slots["index"] = int(nums[0])
+    return Intent(label, slots, prob, source)
+
+
+def route(msg: str, llm=None, threshold: float = CONFIDENCE_THRESHOLD) -> Intent:
+    """
+    Message ka intent. Rules > Naive Bayes > (low confidence pe) llm(prompt).
+    llm(prompt) -> text, optional; na ho toh low confidence pe bhi model ka answer.
+    """
+    text = (msg or "").strip()
+    if not text:
+        return Intent("chat", {}, 1.0, "rule")
+
+    for name, pattern in RULES:
+        m = pattern.search(text)
+        if not m:
+            continue
+        slots = {k: v for k, v in m.groupdict().items() if v}
+        if "query" in slots:
+            slots["query"] = clean_slot(slots["query"])
+            if not slots["query"] or set(slots["query"].lower().split()) <= NOT_A_QUERY:
+                continue  # "kuch batao", "joke batao" - ye chat hai, search nahi
+        if "index" in slots:
+            slots["index"] = int(slots["index"])
+        if "ordinal" in slots:
+            slots["index"] = ORDINALS[slots.pop("ordinal").lower()]
+        if name == "tag":
+            slots["name"] = slots["name"].strip(" .!'\"")
+            words = slots["name"].lower().split()
+            if len(words) > 4 or "?" in text or QUESTION_WORDS & set(words):
+                continue  # poora sentence / sawaal hai, naam nahi
+        return Intent(name, slots, 0.95, "rule")
+
+    if WEB_HINTS.search(text):
+        return Intent("web", {}, 0.85, "rule")
+
+    label, prob = _model.predict(text)
+    if prob >= threshold or llm is None:
+        return _model_intent(text, label, prob, "model")
+
+    try:
+        answer = llm(
+            "Classify this WhatsApp message into exactly one label: " + ", ".join(INTENTS) +
+            ". 'web' means it needs live internet info. Reply with the label only.\n\nMessage: " + text
+        ).strip().lower()
+        for name in INTENTS:
+            if name in answer:
+                return _model_intent(text, name, prob, "llm")
+    except Exception as e:
+        print(f"Intent LLM Error: {e}")
+    return _model_intent(text, label, prob, "model")
+
+
+def rule_only(intent: Intent) -> Intent:
+    """
+    Jahan chat hi fallback hai (voice_bot), wahan gallery actions sirf pakke
+    rule match pe - model ka guess ("ek story sunao" -> history) chat hi rahe.
+    """
+    if intent.source == "rule":
+        return intent
+    return Intent("chat", {}, intent.confidence, intent.source)
+
+
+def needs_web(msg: str, llm=None, threshold: float = CONFIDENCE_THRESHOLD) -> bool:
+    """
+    Web search chahiye? Rules / confident model ka faisla seedha. Low confidence
+    pe default = search nahi ("ok", "hi", "acha" jaise chat pe koi extra call
+    nahi); llm sirf tab jab model khud "web" ki taraf jhuka ho aur message sawaal ho.
+    """
+    text = (msg or "").strip()
+    intent = route(text)
+    if intent.source == "rule" or intent.confidence >= threshold:
+        return intent.name == "web"
+    if llm is None or intent.name != "web" or "?" not in text:
+        return False
+    try:
+        answer = llm(
+            "Does answering this WhatsApp message need live internet info (news, prices, weather, "
+            "scores, today's events)? Reply yes or no only.\n\nMessage: " + text
+        ).strip().lower()
+        return answer.startswith("yes")
+    except Exception as e:
+        print(f"Intent LLM Error: {e}")
+        return False
+
+
+def clean_name(words: list) -> bool:
+    """Naam saaf hai? Possessive/filler words (mera, my, ...) nahi, 3 words tak."""
+    return 0 < len(words) <= 3 and not any(w.lower() in NAME_STOPWORDS for w in words)
+
+
+def extract_name(msg: str):
+    """
+    Reply me se naam nikalo: (name, confidence). Sirf pakka naam high confidence
+    pe - ek Capitalised word ("Rahul") ya saaf rule slot ("ye Chintu hai").
+    "mera bhai Rahul", "my dog tommy" jaise replies LLM ke paas jaate hain.
+    """
+    text = (msg or "").strip()
+    intent = route(text)
+    m = NAME_REPLY.match(text)
+    if m and intent.name != "tag" and "?" not in text:
+        intent = Intent("tag", {"name": m.group("name").strip(" .!'\"")}, 0.95, "rule")
+    if intent.name == "tag" and intent.source == "rule":
+        name = intent.slots["name"]
+        return name, intent.confidence if clean_name(name.split()) else 0.3
+    tokens = re.findall(r"[\w'-]+", text)
+    words = [w for w in tokens if w.lower() not in NAME_STOPWORDS]
+    if not words or "?" in text:
+        return text, 0.0
+    if len(tokens) == 1 and tokens[0][:1].isupper():
+        return tokens[0], 0.9
+    return " ".join(words), 0.3
@@ -1,18 +1,27 @@
 import os
+import uuid
 import base64
-import requests
 from datetime import datetime
 from pathlib import Path
 
 from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from twilio.twiml.messaging_response import MessagingResponse
-from gtts import gTTS
 from pypdf import PdfReader
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from duckduckgo_search import DDGS
 from groq import Groq
+import httpx
+
+from admission import AdmissionController, BUSY_REPLY, form_media_types, media_cost
+from audio_prep import prepare_audio
+from batcher import MicroBatcher, numbered_prompt, parse_json_list
+from intents import CONFIDENCE_THRESHOLD, extract_name, needs_web
+from media import collect_media, download_all, multi_image_prompt, parse_numbered, probe_twilio, run_concurrently
+from voice_stream import groq_tokens, stream_to_speech
+from warmup import MODELS_TTL, ProviderProber, TTLCache, keepalive_for
 
 # --- Configuration ---
 load_dotenv()
@@ -22,21 +31,30 @@ MONGO_URI = os.getenv("MONGO_URI")
 if not GROQ_API_KEY:
     print("⚠️ WARNING: GROQ_API_KEY missing.")
 
-# Initialize Groq
-client = Groq(api_key=GROQ_API_KEY)
+# Initialize Groq. httpx idle keep-alive connections default 5s me band kar deta
+# hai - probe interval se lamba expiry do, warna har probe/request naya TLS handshake.
+PROBE_INTERVAL = int(os.getenv("PROBE_INTERVAL", 60))
+client = Groq(api_key=GROQ_API_KEY, http_client=httpx.Client(
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=8, keepalive_expiry=keepalive_for(PROBE_INTERVAL)),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+))
 
 # --- ⚠️ UPDATED MODELS (Working Now) ---
 TEXT_MODEL = "llama-3.3-70b-versatile"  # NEW STABLE MODEL
 VISION_MODEL = "llama-3.2-11b-vision-preview"
+VISION_MAX_IMAGES = 5  # Groq vision ek request me itni images leta hai
 AUDIO_MODEL = "whisper-large-v3"
 
-app = FastAPI()
+# Startup pe connections garam, phir background me health probes
+prober = ProviderProber(PROBE_INTERVAL)
+app = FastAPI(lifespan=prober.lifespan)
 
 # --- Database ---
 photos_collection = None
 if MONGO_URI:
     try:
-        mongo_client = MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=True)
+        # minPoolSize: kuch connections hamesha khule rahein (cold TLS handshake nahi)
+        mongo_client = MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=True, minPoolSize=2)
         db = mongo_client.thirdeye_db
         photos_collection = db.photos
         print("INFO: Connected to MongoDB Atlas.")
@@ -56,10 +74,22 @@ app.mount("/audios", StaticFiles(directory=str(AUDIO_DIR)), name="audios")
 pending_image_context = {}
 pdf_context = {}
 
-# --- Utilities ---
-def fetch_media_bytes(url: str) -> bytes:
-    return requests.get(url).content
+# --- Warm-up Probes ---
+groq_models = TTLCache(MODELS_TTL)
+prober.register("groq", lambda: groq_models.set([m.id for m in client.models.list().data]))
+prober.register("twilio_media", probe_twilio)
+if photos_collection is not None:
+    prober.register("mongo", lambda: mongo_client.admin.command("ping"))
+
+# --- Admission Control ---
+admission = AdmissionController(
+    max_cost=int(os.getenv("ADMISSION_MAX_COST", 16)),
+    sender_cost=int(os.getenv("ADMISSION_SENDER_COST", 8)),
+    slo_seconds=float(os.getenv("ADMISSION_SLO_SECONDS", 8)),
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", 4)),
+)
 
+# --- Utilities ---
 def search_internet(query: str) -> str:
     try:
         with DDGS() as ddgs:
@@ -75,118 +105,254 @@ def groq_chat(prompt: str, system_msg: str = "You are ThirdEye AI. Reply in the
         ).choices[0].message.content
     except Exception as e: return f"Error: {e}"
 
+def groq_chat_stream(prompt: str, system_msg: str = "You are ThirdEye AI. Reply in the same language as the user."):
+    return groq_tokens(client, TEXT_MODEL,
+                       [{"role": "system", "content": system_msg}, {"role": "user", "content": prompt}])
+
+def image_part(image_bytes: bytes) -> dict:
+    b64_img = base64.b64encode(image_bytes).decode('utf-8')
+    return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_img}"}}
+
 def groq_vision(prompt: str, image_bytes: bytes) -> str:
     try:
-        b64_img = base64.b64encode(image_bytes).decode('utf-8')
         return client.chat.completions.create(
             model=VISION_MODEL,
             messages=[{
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64_img}"}}
-                ]
+                "content": [{"type": "text", "text": prompt}, image_part(image_bytes)]
             }]
         ).choices[0].message.content
     except Exception as e: return f"Error: {e}"
 
-def groq_transcribe(audio_bytes: bytes) -> str:
+def groq_vision_batch(prompt: str, images: list) -> list:
+    """Multiple images -> ek multi-image call per VISION_MAX_IMAGES, fallback per image."""
+    if len(images) == 1: return [groq_vision(prompt, images[0])]
+    descs = []
+    for i in range(0, len(images), VISION_MAX_IMAGES):
+        group = images[i:i + VISION_MAX_IMAGES]
+        parsed = None
+        try:
+            text = client.chat.completions.create(
+                model=VISION_MODEL,
+                messages=[{
+                    "role": "user",
+                    "content": [{"type": "text", "text": multi_image_prompt(prompt, len(group))}]
+                               + [image_part(b) for b in group]
+                }]
+            ).choices[0].message.content
+            parsed = parse_numbered(text, len(group))
+        except Exception as e: print(f"Batch Vision Error: {e}")
+        descs += parsed or run_concurrently(lambda b: groq_vision(prompt, b), group)
+    return descs
+
+def groq_transcribe(audio_bytes: bytes, content_type: str = "audio/ogg") -> str:
     try:
-        temp_path = AUDIO_DIR / "temp_input.mp3"
-        with open(temp_path, "wb") as f: f.write(audio_bytes)
-        with open(temp_path, "rb") as file:
-            return client.audio.transcriptions.create(
-                file=(str(temp_path), file.read()),
-                model=AUDIO_MODEL,
-                response_format="text"
-            )
+        # Temp file nahi - parallel transcriptions ek dusre ki file overwrite kar dete
+        ext = content_type.split("/")[-1].split(";")[0] or "ogg"
+        return client.audio.transcriptions.create(
+            file=(f"input.{ext}", audio_bytes),
+            model=AUDIO_MODEL,
+            response_format="text"
+        )
     except Exception as e: return f"Error: {e}"
 
+# --- Micro-Batching (users ke beech chhoti LLM calls ek saath) ---
+def batch_llm(instruction: str, items: list, line, single) -> list:
+    """
+    Ek batched groq_chat call (line(item) har item ki line); JSON parse na ho
+    toh single(item) per-item calls, parallel. groq_chat error pe "Error: ..."
+    lautata hai - tab raise karo taaki batcher saare futures fail kare aur
+    429/outage me N+1 calls na jaayein.
+    """
+    if len(items) > 1:
+        reply = groq_chat(numbered_prompt(instruction, [line(item) for item in items]))
+        if reply.startswith("Error:"): raise RuntimeError(reply)
+        answers = parse_json_list(reply, len(items))
+        if answers: return answers
+    results = run_concurrently(single, items)
+    for r in results:
+        if r.startswith("Error:"): raise RuntimeError(r)
+    return results
+
+def extract_names_batch(msgs: list) -> list:
+    return batch_llm("For each reply, extract ONLY the name. If it is not a name, answer 'Unknown'.", msgs, repr,
+                     lambda m: groq_chat(f"Extract ONLY the name from: '{m}'. If not a name, say 'Unknown'."))
+
+def compare_batch(pairs: list) -> list:
+    return batch_llm("For each pair of descriptions, is it the same object? Answer YES or NO.", pairs,
+                     lambda p: f"1. '{p[0]}' | 2. '{p[1]}'",
+                     lambda p: groq_chat(f"Compare:\n1. '{p[0]}'\n2. '{p[1]}'\nSame object? YES/NO ONLY."))
+
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", 10))
+name_batcher = MicroBatcher(extract_names_batch, max_batch=int(os.getenv("BATCH_MAX_NAMES", 16)),
+                            max_wait_ms=BATCH_WAIT_MS, name="names")
+compare_batcher = MicroBatcher(compare_batch, max_batch=int(os.getenv("BATCH_MAX_COMPARE", 32)),
+                               max_wait_ms=BATCH_WAIT_MS, name="compare")
+
+# --- Media Handlers (har ek reply lines ki list lautata hai) ---
+def recall_tag(desc: str, recent: list):
+    # Saari comparisons ek saath batcher me; pehla YES (recent order me) jeet-ta hai
+    futures = [compare_batcher.submit_async((desc, item['description'])) for item in recent]
+    for item, fut in zip(recent, futures):
+        try:
+            check = fut.result()
+        except Exception as e:
+            print(f"Compare Error: {e}")
+            continue
+        if "YES" in check.upper():
+            return item['name_tag']
+    return None
+
+def handle_images(images: list, sender: str) -> list:
+    # 1. Vision Analysis (saari images ek batched call me)
+    descs = groq_vision_batch("Describe this image in 1 sentence. Identify the main object.", images)
+
+    # 2. Memory Check
+    # Sirf naam wali photos se compare (bina tag wali recall me kaam nahi aati)
+    recent = (list(photos_collection.find({"user_id": sender, "name_tag": {"$ne": None}}).limit(20))
+              if photos_collection is not None else [])
+    tags = run_concurrently(lambda d: recall_tag(d, recent), descs) if recent else [None] * len(descs)
+
+    lines, unknown = [], []
+    for i, (desc, tag) in enumerate(zip(descs, tags), 1):
+        prefix = f"{i}. " if len(descs) > 1 else ""
+        if tag:
+            lines.append(f"🧠 {prefix}*Recall:* That's '{tag}'!")
+        else:
+            unknown.append(desc)
+            lines.append(f"👁️ {prefix}*Analysis:* {desc}")
+    if unknown:
+        pending_image_context[sender] = {"descs": unknown}
+        lines.append("\nReply with a *Name* to save this." if len(unknown) == 1
+                     else "\nReply with a *Name* for the last photo (baaki bina naam ke save hongi).")
+    return lines
+
+def extract_pdf(args) -> str:
+    idx, sender, data = args
+    path = DOCS_DIR / f"doc_{sender[-4:]}_{idx}.pdf"
+    with open(path, "wb") as f: f.write(data)
+    reader = PdfReader(path)
+    return "\n".join([p.extract_text() for p in reader.pages])
+
+def handle_pdfs(pdfs: list, sender: str) -> list:
+    texts = run_concurrently(extract_pdf, [(i, sender, data) for i, data in enumerate(pdfs)])
+    pdf_context[sender] = "\n\n".join(texts)
+    return [f"✅ PDF Loaded. Ask questions." if len(pdfs) == 1 else f"✅ {len(pdfs)} PDFs Loaded. Ask questions."]
+
+def handle_audios(audios: list) -> tuple:
+    # Upload se pehle silence trim + compact (kam bytes, kam Whisper audio)
+    texts = run_concurrently(lambda a: groq_transcribe(*prepare_audio(a)), audios)
+    # Jawab stream hota hai; har sentence turant TTS me jaata hai
+    fn = f"reply_{datetime.now().strftime('%H%M%S')}_{uuid.uuid4().hex[:8]}.mp3"
+    ai_reply, has_audio = stream_to_speech(
+        groq_chat_stream(f"User said: {' '.join(texts)}. Reply naturally in the same language."),
+        AUDIO_DIR / fn, clean=lambda t: t.replace('*', ''), lang='hi',
+    )
+    # TTS fail hua toh bhi text jawab jayega, bas audio nahi
+    return ai_reply, fn if has_audio else None
+
 # --- Routes ---
 @app.head("/")
 async def health(): return Response(status_code=200)
 
+@app.get("/admission")
+async def admission_stats(): return admission.snapshot()
+
+@app.get("/batches")
+async def batches(): return {"names": name_batcher.snapshot(), "compare": compare_batcher.snapshot()}
+
+@app.get("/providers")
+async def providers(): return {"probes": prober.snapshot(), "groq_models": groq_models.current()}
+
 @app.post("/whatsapp")
 async def whatsapp(request: Request):
     form = await request.form()
-    num_media = int(form.get('NumMedia', 0))
-    msg = form.get('Body', '').strip()
     sender = form.get('From')
     host_url = str(request.base_url).replace("http://", "https://")
+
+    # Queue lambi hai toh LLM tak jaane se pehle hi mana kar do
+    cost = media_cost(form_media_types(form))
+    if not await admission.acquire(sender, cost):
+        resp = MessagingResponse()
+        resp.message(BUSY_REPLY)
+        return Response(content=str(resp), media_type="application/xml")
+
+    try:
+        # Blocking LLM/DB calls thread me, taaki event loop naye requests le sake
+        resp = await run_in_threadpool(handle_message, form, sender, host_url)
+    finally:
+        await admission.release(sender, cost)
+
+    return Response(content=str(resp), media_type="application/xml")
+
+def handle_message(form, sender: str, host_url: str) -> MessagingResponse:
+    num_media = int(form.get('NumMedia', 0))
+    msg = form.get('Body', '').strip()
     resp = MessagingResponse()
 
     try:
         # === MEDIA ===
         if num_media > 0:
-            m_type = form.get('MediaContentType0')
-            m_url = form.get('MediaUrl0')
-            m_data = fetch_media_bytes(m_url)
+            files = download_all(collect_media(form))
+            images = [d for d, t in files if 'image' in t]
+            pdfs = [d for d, t in files if 'application/pdf' in t]
+            audios = [(d, t) for d, t in files if 'audio' in t]
 
-            if 'image' in m_type:
-                # 1. Vision Analysis
-                desc = groq_vision("Describe this image in 1 sentence. Identify the main object.", m_data)
-                
-                # 2. Memory Check
-                found_tag = None
-                if photos_collection is not None:
-                    recent = photos_collection.find({"user_id": sender}).limit(20)
-                    for item in recent:
-                        check = groq_chat(f"Compare:\n1. '{desc}'\n2. '{item['description']}'\nSame object? YES/NO ONLY.")
-                        if "YES" in check.upper():
-                            found_tag = item['name_tag']
-                            break
-                
-                if found_tag:
-                    resp.message(f"🧠 *Recall:* That's '{found_tag}'!")
-                else:
-                    pending_image_context[sender] = {"desc": desc}
-                    resp.message(f"👁️ *Analysis:* {desc}\n\nReply with a *Name* to save this.")
-
-            elif 'application/pdf' in m_type:
-                path = DOCS_DIR / f"doc_{sender[-4:]}.pdf"
-                with open(path, "wb") as f: f.write(m_data)
-                reader = PdfReader(path)
-                pdf_context[sender] = "\n".join([p.extract_text() for p in reader.pages])
-                resp.message(f"✅ PDF Loaded. Ask questions.")
-
-            elif 'audio' in m_type:
-                user_text = groq_transcribe(m_data)
-                ai_reply = groq_chat(f"User said: {user_text}. Reply naturally in the same language.")
-                
-                tts = gTTS(text=ai_reply.replace('*', ''), lang='hi')
-                fn = f"reply_{datetime.now().strftime('%H%M%S')}.mp3"
-                tts.save(str(AUDIO_DIR / fn))
-                
+            # Images, PDFs aur audio ek saath process karo, reply ek hi banega
+            jobs = []
+            if images: jobs.append(lambda: handle_images(images, sender))
+            if pdfs: jobs.append(lambda: handle_pdfs(pdfs, sender))
+            if audios: jobs.append(lambda: handle_audios(audios))
+            results = run_concurrently(lambda job: job(), jobs)
+
+            voice = results.pop() if audios else None
+            lines = [line for part in results for line in part]
+            if lines:
+                resp.message("\n".join(lines))
+
+            if voice is not None:
+                ai_reply, fn = voice
                 resp.message(f"🗣️ {ai_reply}")
-                resp.message("").media(f"{host_url}audios/{fn}")
+                if fn: resp.message("").media(f"{host_url}audios/{fn}")
 
         # === TEXT ===
         else:
             # 1. Save Name
             if sender in pending_image_context:
                 ctx = pending_image_context[sender]
-                clean = groq_chat(f"Extract ONLY the name from: '{msg}'. If not a name, say 'Unknown'.").strip()
-                final_name = msg if "Unknown" in clean else clean
+                # Pehle local extraction; sirf unclear reply pe LLM
+                final_name, confidence = extract_name(msg)
+                if confidence < CONFIDENCE_THRESHOLD:
+                    try:
+                        clean = name_batcher.submit(msg).strip()
+                        final_name = msg if "Unknown" in clean else clean
+                    except Exception as e:
+                        print(f"Name Error: {e}")
+                        final_name = msg
                 
+                # Ek naam = ek photo: sirf aakhri unknown photo ko naam milta hai
+                # (image.py/voice_bot.py jaisa), baaki bina tag ke save hoti hain
                 if photos_collection is not None:
-                    photos_collection.insert_one({
-                        "user_id": sender, "description": ctx['desc'], 
-                        "name_tag": final_name, "timestamp": datetime.now()
-                    })
+                    descs = ctx['descs']
+                    photos_collection.insert_many([{
+                        "user_id": sender, "description": desc,
+                        "name_tag": final_name if i == len(descs) - 1 else None, "timestamp": datetime.now()
+                    } for i, desc in enumerate(descs)])
                 del pending_image_context[sender]
-                resp.message(f"✅ Saved as '{final_name}'.")
+                resp.message(f"✅ Saved as '{final_name}'." if len(ctx['descs']) == 1
+                             else f"✅ Last photo saved as '{final_name}'. Baaki photos bina naam ke save hui.")
 
             # 2. Chat
             else:
                 web_info = ""
-                if "?" in msg:
+                if needs_web(msg, llm=lambda p: groq_chat(p, system_msg="You are an intent classifier.")):
                     s = search_internet(msg)
                     if s: web_info = f"Web Info: {s}"
                 
                 memories = ""
                 if photos_collection is not None:
                     recent = photos_collection.find({"user_id": sender}).limit(3)
-                    memories = ", ".join([r['name_tag'] for r in recent])
+                    memories = ", ".join([r['name_tag'] for r in recent if r.get('name_tag')])
 
                 ans = groq_chat(f"Memories: {memories}\nWeb: {web_info}\nUser: {msg}")
                 resp.message(ans)
@@ -195,4 +361,4 @@ async def whatsapp(request: Request):
         print(f"Error: {e}")
         resp.message("⚠️ Server busy. Try again.")
 
-    return Response(content=str(resp), media_type="application/xml")
\ No newline at end of file
+    return resp
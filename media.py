@@ -0,0 +1,111 @@
+import re
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Multi-Attachment Helpers ---
+# Twilio ek message me NumMedia attachments bhejta hai (MediaUrl0..N-1).
+# Ye helpers sab attachments ko ek saath (per-message cap ke andar) download
+# aur process karte hain.
+
+MAX_MEDIA_WORKERS = 4  # ek message ke liye parallel downloads / AI calls
+TWILIO_API = "https://api.twilio.com"
+MAX_MEDIA_HOSTS = 8
+
+# Ek shared keep-alive session: Twilio media ka TLS handshake har download pe nahi
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def collect_media(form) -> list:
+    """[(url, content_type), ...] sab attachments ke liye, order same rehta hai."""
+    num_media = int(form.get('NumMedia', 0) or 0)
+    items = []
+    for i in range(num_media):
+        url = form.get(f'MediaUrl{i}')
+        if url:
+            items.append((url, form.get(f'MediaContentType{i}') or ""))
+    return items
+
+
+# MediaUrl api.twilio.com pe hota hai par bytes redirect ke baad CDN host se
+# aate hain - wo hosts bhi yaad rakho taaki probe unhe bhi garam rakhe
+media_hosts = set()
+
+
+def fetch_media_bytes(url: str) -> bytes:
+    r = http_session.get(url)
+    for hop in r.history + [r]:
+        parts = urlsplit(hop.url)
+        if parts.scheme == "https" and len(media_hosts) < MAX_MEDIA_HOSTS:
+            media_hosts.add(f"https://{parts.netloc}")
+    return r.content
+
+
+def probe_twilio():
+    """Warm-up probe: Twilio API + redirect wale media hosts ke connections khule rakho."""
+    http_session.head(TWILIO_API, timeout=5)
+    for host in media_hosts - {TWILIO_API}:
+        # Host ka root 403/404 de sakta hai - hume sirf connection chahiye
+        http_session.head(host, timeout=5)
+
+
+def run_concurrently(fn, items, limit: int = MAX_MEDIA_WORKERS) -> list:
+    """fn(item) ko parallel chalao, results input ke order me wapas."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(limit, len(items))) as pool:
+        return list(pool.map(fn, items))
+
+
+def download_all(media: list, limit: int = MAX_MEDIA_WORKERS) -> list:
+    """[(data, content_type), ...] - downloads parallel me."""
+    blobs = run_concurrently(lambda m: fetch_media_bytes(m[0]), media, limit)
+    return [(data, m_type) for data, (_, m_type) in zip(blobs, media)]
+
+
+# --- Batched Vision ---
+def multi_image_prompt(prompt: str, count: int) -> str:
+    return (
+        f"{prompt}\n\nYou are given {count} images in order. "
+        f"Reply with exactly {count} lines, numbered '1.' to '{count}.', one line per image."
+    )
+
+
+def parse_numbered(text: str, count: int):
+    """'1. ...\\n2. ...' ko list me todo. Count match na ho toh None."""
+    found = {}
+    for line in (text or "").splitlines():
+        m = re.match(r'\s*\**\s*(\d+)\s*[.):\-]\**\s*(.+)', line)
+        if m and 1 <= int(m.group(1)) <= count:
+            found.setdefault(int(m.group(1)), m.group(2).strip())
+    if len(found) != count:
+        return None
+    return [found[i] for i in range(1, count + 1)]
+
+
+def gemini_describe_images(model, prompt: str, images: list, limit: int = MAX_MEDIA_WORKERS) -> list:
+    """
+    Gemini se saari images ki description ek hi call me (multi-image prompt).
+    Reply parse na ho toh har image ke liye alag call (parallel) par fallback.
+    """
+    if len(images) == 1:
+        data, m_type = images[0]
+        return [model.generate_content([prompt, {"mime_type": m_type, "data": data}]).text]
+
+    parts = [multi_image_prompt(prompt, len(images))]
+    parts += [{"mime_type": m_type, "data": data} for data, m_type in images]
+    try:
+        descs = parse_numbered(model.generate_content(parts).text, len(images))
+        if descs:
+            return descs
+    except Exception as e:
+        print(f"Batch Vision Error: {e}")
+
+    return run_concurrently(
+        lambda img: model.generate_content([prompt, {"mime_type": img[1], "data": img[0]}]).text,
+        images, limit,
+    )
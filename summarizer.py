@@ -0,0 +1,183 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- Map-Reduce Summariser ---
+# Lambi PDF ko 30k characters pe kaatne ki jagah: text ko chunks me todo,
+# har chunk ki summary parallel me banao (provider rate limit ke andar),
+# phir partial summaries ko milake final summary banao (reduce).
+
+CHUNK_CHARS = 12000    # ek map call me kitna text
+CONTEXT_CHARS = 30000  # Q&A prompt me kitna context bhejna hai
+
+MAP_PROMPT = ("This is part {part} of {total} of a document. Summarize this part in Hinglish "
+              "in a few bullet points. Keep names, numbers, dates and amounts.\n\nText:\n{text}")
+REDUCE_PROMPT = ("Below are summaries of consecutive parts of one document. Combine them into one "
+                 "concise summary in Hinglish. Keep the important names, numbers and dates.\n\n{text}")
+
+
+class RateLimiter:
+    """
+    Token bucket: `rpm` requests per minute, threads ke beech shared.
+    Bucket chhota (burst) rakha hai - capacity = rpm hoti toh pehle minute me
+    poora bucket + refills, yaani ~2x rpm calls nikal jaati aur 429 aate.
+    """
+
+    def __init__(self, rpm: int, burst: int = 1):
+        self.interval = 60.0 / max(rpm, 1)
+        self.capacity = max(min(burst, rpm), 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+
+class LimitedModel:
+    """
+    Gemini model ka wrapper: har generate_content shared limiter se guzarta hai,
+    taaki Q&A, audio, photos aur summaries ek hi RPM quota ke andar rahein.
+    """
+
+    def __init__(self, model, limiter: RateLimiter):
+        self.model = model
+        self.limiter = limiter
+
+    def generate_content(self, *args, **kwargs):
+        self.limiter.acquire()
+        return self.model.generate_content(*args, **kwargs)
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    """Text ko ~max_chars ke chunks me todo, line boundary pe (order same)."""
+    chunks, current, size = [], [], 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_chars:  # ek hi line bahut lambi ho
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [c for c in chunks if c.strip()]
+
+
+class MapReduceSummarizer:
+    """
+    generate(prompt) -> text. Saari LLM calls `limiter` se guzarti hain.
+
+    - cached: {chunk_index: summary} pehle se bani hui chunk summaries (reuse)
+    - on_chunk(idx, summary): har nayi chunk summary pe (store me save karne ke liye)
+    - on_partial(summary): pehle chunk ki summary jaise hi ready ho (user ko jaldi bhejne ke liye)
+    """
+
+    def __init__(self, generate, limiter: RateLimiter = None, max_workers: int = 4, chunk_chars: int = CHUNK_CHARS):
+        self.generate = generate
+        self.limiter = limiter
+        self.max_workers = max_workers
+        self.chunk_chars = chunk_chars
+
+    def _call(self, prompt: str) -> str:
+        if self.limiter:
+            self.limiter.acquire()
+        return self.generate(prompt)
+
+    def map(self, chunks: list, cached: dict = None, on_chunk=None, on_partial=None) -> list:
+        summaries = dict(cached or {})
+        if on_partial and 0 in summaries:
+            on_partial(summaries[0])
+        todo = [i for i in range(len(chunks)) if i not in summaries]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                pool.submit(self._call, MAP_PROMPT.format(part=i + 1, total=len(chunks), text=chunks[i])): i
+                for i in todo
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                summaries[i] = fut.result()
+                if on_chunk:
+                    on_chunk(i, summaries[i])
+                if on_partial and i == 0:
+                    on_partial(summaries[i])
+        return [summaries[i] for i in range(len(chunks))]
+
+    def reduce(self, summaries: list) -> str:
+        # Har round me groups (kam se kam 2 summaries each) combine karo - list har
+        # baar aadhi ya usse chhoti hoti hai, isliye bina kuch kaate converge karta hai
+        while len(summaries) > 1:
+            groups = self.group(summaries)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                summaries = list(pool.map(lambda g: self._call(REDUCE_PROMPT.format(text=g)), groups))
+        return summaries[0]
+
+    def group(self, summaries: list) -> list:
+        """Lagatar summaries ko ~chunk_chars ke groups me, har group me >= 2."""
+        groups, current, size = [], [], 0
+        for i, s in enumerate(summaries, 1):
+            piece = f"[Part {i}]\n{s}"
+            if len(current) >= 2 and size + len(piece) > self.chunk_chars:
+                groups.append(current)
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])  # akeli summary ka alag call bekaar hai
+        else:
+            groups.append(current)
+        return ["\n\n".join(g) for g in groups]
+
+    def summarize(self, text: str, cached: dict = None, on_chunk=None, on_partial=None):
+        """(final_summary, chunk_summaries)"""
+        chunks = chunk_text(text, self.chunk_chars)
+        if len(chunks) == 1:
+            summary = self._call(f"Summarize this document in Hinglish. Keep it concise.\n\nText:\n{chunks[0]}")
+            return summary, [summary]
+        chunk_summaries = self.map(chunks, cached, on_chunk, on_partial)
+        return self.reduce(chunk_summaries), chunk_summaries
+
+
+def build_context(question: str, text: str, summary: str = None, chunk_summaries: list = None,
+                  budget: int = CONTEXT_CHARS, chunk_chars: int = CHUNK_CHARS) -> str:
+    """
+    Q&A ke liye context. Chhota document poora jaata hai; bada ho toh overall
+    summary + har part ki summary + sawaal se sabse milte-julte raw chunks.
+    """
+    if len(text) <= budget:
+        return text
+
+    parts = []
+    if summary:
+        parts.append(f"Overall summary:\n{summary}")
+    if chunk_summaries:
+        parts.append("Part summaries:\n" + "\n".join(f"[Part {i}] {s}" for i, s in enumerate(chunk_summaries, 1)))
+    context = "\n\n".join(parts)[:budget // 2]
+
+    # Keyword overlap se relevant chunks chuno
+    words = set(re.findall(r'\w{3,}', question.lower()))
+    chunks = chunk_text(text, chunk_chars)
+    scored = sorted(range(len(chunks)),
+                    key=lambda i: -len(words & set(re.findall(r'\w{3,}', chunks[i].lower()))))
+    for i in scored:
+        piece = f"\n\n[Part {i + 1} text]\n{chunks[i]}"
+        if len(context) + len(piece) > budget:
+            break
+        context += piece
+    return context
@@ -1,6 +1,6 @@
 import os
+import uuid
 import sqlite3
-import requests
 import re  # Text safai ke liye
 import google.generativeai as genai
 from fastapi import FastAPI, Request, Response
@@ -9,7 +9,13 @@ from twilio.twiml.messaging_response import MessagingResponse
 from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from gtts import gTTS  # Bolne ke liye
+
+from audio_prep import prepare_audio
+from gallery import GalleryBrowser, ensure_user_column, nth_memory
+from intents import route, rule_only
+from media import collect_media, download_all, gemini_describe_images, probe_twilio, run_concurrently
+from voice_stream import gemini_tokens, stream_to_speech  # Bolne ke liye (sentence by sentence)
+from warmup import MODELS_TTL, ProviderProber, TTLCache, list_gemini_models
 
 # --- 1. SETUP ---
 BASE_DIR = Path(__file__).resolve().parent
@@ -24,7 +30,13 @@ genai.configure(api_key=api_key)
 # Stable Model use kar rahe hain
 model = genai.GenerativeModel('gemini-flash-latest')
 
-app = FastAPI()
+# Startup pe Gemini/Twilio connections garam, phir background health probes
+prober = ProviderProber(int(os.getenv("PROBE_INTERVAL", 60)))
+gemini_models = TTLCache(MODELS_TTL)
+prober.register("gemini", lambda: gemini_models.set(list_gemini_models(genai)))
+prober.register("twilio_media", probe_twilio)
+
+app = FastAPI(lifespan=prober.lifespan)
 
 # Folders Setup
 IMAGES_DIR = BASE_DIR / "images"
@@ -46,12 +58,17 @@ def init_db():
                   description TEXT, 
                   timestamp TEXT, 
                   filename TEXT, 
-                  user_tag TEXT)''')
+                  user_tag TEXT,
+                  user_id TEXT)''')
     conn.commit()
+    ensure_user_column(conn, os.getenv("LEGACY_OWNER"))  # purane rows ka owner (single-user setup)
     conn.close()
 
 init_db()
 
+# Har user ki apni gallery, page by page ('aur' likhne pe agla page)
+browser = GalleryBrowser()
+
 # --- HELPER: TEXT CLEANER ---
 def clean_text_for_audio(text):
     """Emojis aur Symbols hatayega taaki Audio saaf aaye"""
@@ -61,12 +78,94 @@ def clean_text_for_audio(text):
     clean = re.sub(r'[^\w\s\u0900-\u097F,?.!]', '', clean)
     return clean.strip()
 
+# --- HELPER: GALLERY PAGE TEXT ---
+def format_page(kind, query, rows, has_more, first=True):
+    if kind == "search":
+        if not rows:
+            return f"❌ '{query}' nahi mila."
+        _, desc, _, _, tag = rows[0]
+        txt = f"🖼️ **{tag}**\n📝 {desc}"
+        if has_more:
+            txt += "\n\n👉 Aur bhi hain, 'aur' likho."
+        return txt
+
+    txt = "📚 **Recent Photos:**\n" if first else "📚 **Aur Photos:**\n"
+    for _, desc, _, _, tag in rows:
+        name = tag if tag else "Unknown"
+        txt += f"• {name}: {desc[:30]}...\n"
+    if has_more:
+        txt += "\n👉 Agli photos ke liye 'aur' likho."
+    return txt
+
+# --- HELPER: MEDIA PROCESSING ---
+def save_photos(images, sender):
+    """Saari photos save + ek batched Gemini call se describe. Reply text lautata hai."""
+    try:
+        # uuid suffix: parallel requests same second me ek dusre ki file overwrite na karein
+        stamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        filenames = [f"img_{stamp}.jpg" if len(images) == 1 else f"img_{stamp}_{i+1}.jpg"
+                     for i in range(len(images))]
+        for (img_data, _), filename in zip(images, filenames):
+            with open(IMAGES_DIR / filename, "wb") as f:
+                f.write(img_data)
+        
+        # Gemini Vision
+        descriptions = gemini_describe_images(model, "Describe this image specifically.", images)
+        
+        # DB Save
+        conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+        c = conn.cursor()
+        time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.executemany("INSERT INTO memories (description, timestamp, filename, user_tag, user_id) VALUES (?, ?, ?, ?, ?)", 
+                      [(d, time_now, fn, None, sender) for d, fn in zip(descriptions, filenames)])
+        conn.commit()
+        conn.close()
+
+        if len(descriptions) == 1:
+            return f"✅ Photo Save: {descriptions[0]}\n\n👉 Naam dene ke liye likho: 'Ye [Naam] hai'"
+        lines = "\n".join(f"{i}. {d}" for i, d in enumerate(descriptions, 1))
+        return f"✅ {len(descriptions)} Photos Save:\n{lines}\n\n👉 Naam dene ke liye likho: 'Ye [Naam] hai'"
+    except Exception as e:
+        print(f"Image Error: {e}")
+        return "Error saving image."
+
+def reply_to_audio(audios):
+    """
+    Saare voice notes ek hi Gemini call me, ek hi jawab. Jawab stream hota hai
+    aur har sentence turant TTS me jaata hai. (text, audio_filename ya None) lautata hai.
+    """
+    # Upload se pehle silence trim + compact
+    audio_parts = [{"mime_type": c_type, "data": data} for data, c_type in run_concurrently(prepare_audio, audios)]
+    
+    # Gemini Process (Language Detection)
+    prompt = """
+    Listen to this audio.
+    1. If user speaks Hindi, reply in Hindi.
+    2. If English, reply in English.
+    3. Keep it short and friendly.
+    """
+    if len(audio_parts) > 1:
+        prompt += "The user sent several voice notes in order; answer them together in one reply.\n"
+
+    # 'hi' (Hindi) engine use kar rahe hain jo Indian English bhi achi bolta hai
+    audio_filename = f"reply_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.mp3"
+    bot_text_reply, has_audio = stream_to_speech(gemini_tokens(model, [prompt] + audio_parts),
+                                                 AUDIO_DIR / audio_filename, clean=clean_text_for_audio, lang='hi')
+    # TTS fail hua toh bhi text jawab jayega, bas audio nahi
+    return bot_text_reply, audio_filename if has_audio else None
+
 # --- 3. WHATSAPP LOGIC ---
+@app.get("/providers")
+async def providers():
+    # Model list background probe se cached aati hai, request path pe network call nahi
+    return {"probes": prober.snapshot(), "gemini_models": gemini_models.current()}
+
 @app.post("/whatsapp")
 async def whatsapp_reply(request: Request):
     form = await request.form()
     num_media = int(form.get('NumMedia', 0))
     msg_body = form.get('Body', '').strip()
+    sender = form.get('From')
     
     # URL setup (Audio bhejne ke liye)
     host_url = str(request.base_url)
@@ -75,87 +174,68 @@ async def whatsapp_reply(request: Request):
 
     # === A. MEDIA HANDLING ===
     if num_media > 0:
-        media_url = form.get('MediaUrl0')
-        content_type = form.get('MediaContentType0')
+        media = [(url, c_type) for url, c_type in collect_media(form)
+                 if 'image' in c_type or 'audio' in c_type]
         
-        # 1. PHOTO AAYI HAI 📸
-        if 'image' in content_type:
-            try:
-                # Image Download
-                img_data = requests.get(media_url).content
-                filename = f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-                with open(IMAGES_DIR / filename, "wb") as f:
-                    f.write(img_data)
-                
-                # Gemini Vision
-                image_parts = [{"mime_type": content_type, "data": img_data}]
-                ai_response = model.generate_content(["Describe this image specifically.", image_parts[0]])
-                description = ai_response.text
-                
-                # DB Save
-                conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-                c = conn.cursor()
-                time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                c.execute("INSERT INTO memories (description, timestamp, filename, user_tag) VALUES (?, ?, ?, ?)", 
-                          (description, time_now, filename, None))
-                conn.commit()
-                conn.close()
-
-                resp.message(f"✅ Photo Save: {description}\n\n👉 Naam dene ke liye likho: 'Ye [Naam] hai'")
-            except Exception as e:
-                resp.message("Error saving image.")
-
-        # 2. AUDIO AAYA HAI 🎙️ -> 🗣️
-        elif 'audio' in content_type:
-            try:
-                # Step A: Audio Download
-                audio_data = requests.get(media_url).content
-                audio_part = {"mime_type": content_type, "data": audio_data}
-                
-                # Step B: Gemini Process (Language Detection)
-                prompt = """
-                Listen to this audio.
-                1. If user speaks Hindi, reply in Hindi.
-                2. If English, reply in English.
-                3. Keep it short and friendly.
-                """
-                ai_response = model.generate_content([prompt, audio_part])
-                bot_text_reply = ai_response.text
-                
-                # MESSAGE 1: Pehle Text bhejo
-                resp.message(f"🗣️ {bot_text_reply}")
-                
-                # Step C: Audio Generation (Clean Text se)
-                clean_reply = clean_text_for_audio(bot_text_reply)
-                
-                # 'hi' (Hindi) engine use kar rahe hain jo Indian English bhi achi bolta hai
-                tts = gTTS(text=clean_reply, lang='hi', slow=False)
-                
-                audio_filename = f"reply_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-                tts.save(str(AUDIO_DIR / audio_filename))
-                
-                # MESSAGE 2: Phir Audio bhejo
-                msg2 = resp.message("") # Empty text body for audio message
-                audio_link = f"{host_url}audios/{audio_filename}"
-                msg2.media(audio_link)
-
-            except Exception as e:
-                print(f"Audio Error: {e}")
-                resp.message("Awaz samajh nahi aayi.")
+        try:
+            files = download_all(media)
+        except Exception as e:
+            print(f"Download Error: {e}")
+            files = []
+            resp.message("Media download nahi ho paya.")
+
+        if files:
+            images = [f for f in files if 'image' in f[1]]
+            audios = [f for f in files if 'audio' in f[1]]
+
+            def audio_job():
+                try:
+                    return reply_to_audio(audios)
+                except Exception as e:
+                    print(f"Audio Error: {e}")
+                    return None
+
+            # Photos aur Voice notes parallel me process
+            jobs = []
+            if images: jobs.append(lambda: save_photos(images, sender))
+            if audios: jobs.append(audio_job)
+            results = run_concurrently(lambda job: job(), jobs)
+
+            # 1. PHOTO AAYI HAI 📸
+            if images:
+                resp.message(results[0])
+
+            # 2. AUDIO AAYA HAI 🎙️ -> 🗣️
+            if audios:
+                if results[-1] is None:
+                    resp.message("Awaz samajh nahi aayi.")
+                else:
+                    bot_text_reply, audio_filename = results[-1]
+
+                    # MESSAGE 1: Pehle Text bhejo
+                    resp.message(f"🗣️ {bot_text_reply}")
+                    
+                    # MESSAGE 2: Phir Audio bhejo (TTS fail hua ho toh sirf text)
+                    if audio_filename:
+                        msg2 = resp.message("") # Empty text body for audio message
+                        audio_link = f"{host_url}audios/{audio_filename}"
+                        msg2.media(audio_link)
         
-        else:
+        elif not media:
             resp.message("Sirf Photo 📸 ya Audio 🎙️ bhejo.")
 
     # === B. TEXT HANDLING (Smart Gallery + Chat) ===
     else:
-        msg_lower = msg_body.lower()
+        # Local intent router (rules + chhota model), LLM call nahi.
+        # Yahan chat fallback hai - gallery actions sirf pakke rule match pe.
+        intent = rule_only(route(msg_body))
 
         # Name Tagging Logic
-        if msg_lower.startswith("ye ") and msg_lower.endswith(" hai"):
-            name_tag = msg_body[3:-4].strip()
+        if intent.name == "tag":
+            name_tag = intent.slots["name"]
             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
             c = conn.cursor()
-            c.execute("SELECT id FROM memories ORDER BY id DESC LIMIT 1")
+            c.execute("SELECT id FROM memories WHERE user_id = ? ORDER BY id DESC LIMIT 1", (sender,))
             row = c.fetchone()
             if row:
                 c.execute("UPDATE memories SET user_tag = ? WHERE id = ?", (name_tag, row[0]))
@@ -166,36 +246,38 @@ async def whatsapp_reply(request: Request):
             conn.close()
 
         # Photo Searching Logic
-        elif "dikhao" in msg_lower or "batao" in msg_lower:
-            search_name = msg_lower.replace("dikhao", "").replace("batao", "").replace("k bare me", "").strip()
+        elif intent.name == "search":
+            search_name = intent.slots["query"]
             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-            c = conn.cursor()
-            c.execute("SELECT description, filename, timestamp, user_tag FROM memories WHERE user_tag LIKE ? OR description LIKE ? ORDER BY id DESC LIMIT 1", 
-                      (f'%{search_name}%', f'%{search_name}%'))
-            row = c.fetchone()
+            rows, has_more = browser.page(conn, sender, "search", query=search_name)
             conn.close()
+            resp.message(format_page("search", search_name, rows, has_more))
+            # Note: Localhost pe photo phone pe shayad na dikhe
+            # resp.message("").media(f"{host_url}images/{rows[0][3]}") 
 
-            if row:
-                desc, fname, time, tag = row
-                img_link = f"{host_url}images/{fname}"
-                resp.message(f"🖼️ **{tag}**\n📝 {desc}")
-                # Note: Localhost pe photo phone pe shayad na dikhe
-                # resp.message("").media(img_link) 
+        # Specific Photo: "2nd photo"
+        elif intent.name == "photo_index":
+            conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+            r = nth_memory(conn, sender, intent.slots["index"]) if intent.slots["index"] > 0 else None
+            conn.close()
+            if r:
+                resp.message(f"📸 **Photo #{intent.slots['index']}:** {r[1] or 'Unknown'}\n📝 {r[0]}")
             else:
-                resp.message(f"❌ '{search_name}' nahi mila.")
+                resp.message("Itni photos abhi nahi hain.")
         
-        # History Logic
-        elif 'history' in msg_lower:
+        # History Logic (page by page)
+        elif intent.name == "history":
             conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
-            c = conn.cursor()
-            c.execute("SELECT description, user_tag FROM memories ORDER BY id DESC LIMIT 5")
-            rows = c.fetchall()
+            rows, has_more = browser.page(conn, sender, "history")
+            conn.close()
+            resp.message(format_page("history", None, rows, has_more))
+
+        # Next Page: "aur"
+        elif intent.name == "more" and sender in browser.state:
+            conn = sqlite3.connect(str(BASE_DIR / 'memory.db'))
+            page = browser.next_page(conn, sender)
             conn.close()
-            txt = "📚 **Recent Photos:**\n"
-            for i, r in enumerate(rows):
-                name = r[1] if r[1] else "Unknown"
-                txt += f"{i+1}. {name}: {r[0][:30]}...\n"
-            resp.message(txt)
+            resp.message(format_page(*page, first=False))
 
         # Normal Chat
         else:
@@ -0,0 +1,110 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from gtts import gTTS
+
+# --- Streaming Text -> Voice ---
+# LLM ka jawab token by token aata hai. Jaise hi ek sentence poora ho, use
+# TTS pe bhej do (parallel), aur MP3 segments ko order me file me jodte jao.
+# Isse voice reply ka time ~max(LLM, TTS) hota hai, LLM + TTS nahi.
+
+SENTENCE_END = re.compile(r'.+?(?:[.!?।]+["\')\]]*(?=\s)|\n+)', re.S)
+MIN_SENTENCE_CHARS = 40  # bahut chhote pieces ko agle sentence se jodo (TTS call bachti hai)
+TTS_WORKERS = 4
+
+
+def split_sentences(token_iter, min_chars: int = MIN_SENTENCE_CHARS):
+    """Tokens ka stream -> poore sentences ka stream (jaise hi ready ho)."""
+    buffer = ""
+    for token in token_iter:
+        buffer += token or ""
+        pos, pending = 0, ""
+        for m in SENTENCE_END.finditer(buffer):
+            pending += m.group(0)
+            pos = m.end()
+            if len(pending.strip()) >= min_chars:
+                yield pending.strip()
+                pending = ""
+        # Chhota bacha hua hissa wapas buffer me
+        buffer = pending + buffer[pos:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def synthesize(text: str, lang: str = 'hi') -> bytes:
+    fp = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(fp)
+    return fp.getvalue()
+
+
+def stream_to_speech(token_iter, out_path, clean=None, lang: str = 'hi', max_workers: int = TTS_WORKERS):
+    """
+    token_iter ko consume karke (text, has_audio) lautata hai aur out_path pe MP3 likhta hai.
+    clean(sentence) -> TTS ke liye saaf text (emojis/markdown hatana).
+    TTS fail ho toh bhi pura text milta hai; adhuri/khali file hata di jaati hai
+    aur has_audio False (caller sirf text bheje).
+    """
+    parts = []
+    try:
+        has_audio = _speak(split_sentences(_collect(token_iter, parts)), out_path, clean, lang, max_workers)
+    except BaseException:
+        # LLM stream hi toot gaya - adhuri MP3 disk pe na chhodo
+        Path(out_path).unlink(missing_ok=True)
+        raise
+    if not has_audio:
+        Path(out_path).unlink(missing_ok=True)
+    return "".join(parts), has_audio
+
+
+def _speak(sentences, out_path, clean, lang, max_workers) -> bool:
+    """Sentences ko TTS karke out_path me order se likho. TTS fail / khali = False."""
+    futures = []
+    written, failed = 0, False
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, open(out_path, "wb") as out:
+        for sentence in sentences:
+            if failed:
+                continue  # TTS band, par text poora jama karte raho
+            spoken = clean(sentence) if clean else sentence
+            if spoken.strip():
+                futures.append(pool.submit(synthesize, spoken, lang))
+            # Jo segments order me ready hain unhe abhi likh do
+            try:
+                while written < len(futures) and futures[written].done():
+                    out.write(futures[written].result())
+                    written += 1
+            except Exception as e:
+                print(f"TTS Error: {e}")
+                failed = True
+        if not failed:
+            try:
+                for fut in futures[written:]:
+                    out.write(fut.result())
+            except Exception as e:
+                print(f"TTS Error: {e}")
+                failed = True
+        return not failed and out.tell() > 0
+
+
+def _collect(token_iter, parts: list):
+    # Stream ko aage bhejte hue pura text bhi jama karo
+    for token in token_iter:
+        parts.append(token or "")
+        yield token
+
+
+# --- Provider Token Streams ---
+def gemini_tokens(model, contents):
+    for chunk in model.generate_content(contents, stream=True):
+        try:
+            yield chunk.text
+        except ValueError:  # safety-blocked / empty chunk
+            continue
+
+
+def groq_tokens(client, model_name: str, messages: list):
+    stream = client.chat.completions.create(model=model_name, messages=messages, stream=True)
+    for chunk in stream:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
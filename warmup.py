@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# --- Provider Warm-up & Health Prober ---
+# Idle ke baad pehle request ko Groq/Gemini/Twilio/Mongo ka TLS handshake
+# dena padta tha. Ab startup pe hi connections khol dete hain aur ek background
+# task har provider ko thodi thodi der me probe karta hai - pools garam rehte
+# hain, latency record hoti hai, aur model list TTL cache me rehti hai.
+
+PROBE_INTERVAL = 60      # seconds, har provider probe ke beech
+MODELS_TTL = 15 * 60     # model list kitni der tak valid
+PROBE_TIMEOUT = 10       # ek probe isse zyada atke toh timeout maan lo
+STARTUP_TIMEOUT = 5      # startup warm-up ka intezaar max itna; baaki background me
+LATENCY_WINDOW = 20      # rolling latency samples per provider
+
+
+def keepalive_for(interval: float) -> float:
+    """
+    HTTP client ka idle keep-alive expiry: probe interval se lamba, taaki agla
+    probe (ya user request) wahi khula connection use kare, naya handshake nahi.
+    """
+    return interval * 2 + 15
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0.0
+        self.lock = threading.Lock()
+
+    def current(self):
+        """Fresh value, ya None agar TTL nikal gaya (probe fail ho rahe hain)."""
+        with self.lock:
+            return self.value if time.monotonic() < self.expires else None
+
+    def set(self, value):
+        with self.lock:
+            self.value, self.expires = value, time.monotonic() + self.ttl
+
+
+class ProviderProber:
+    def __init__(self, interval: float = PROBE_INTERVAL, timeout: float = PROBE_TIMEOUT,
+                 startup_timeout: float = STARTUP_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.probes = {}
+        self.latency = {}
+        self.status = {}
+        self._task = None
+
+    def register(self, name: str, probe):
+        """probe() ek sasti call hai jo connection use kare (list models, ping, HEAD)."""
+        self.probes[name] = probe
+        self.latency[name] = deque(maxlen=LATENCY_WINDOW)
+        self.status[name] = {"ok": None, "error": None, "checked": None}
+
+    def run_probe(self, name: str):
+        start = time.perf_counter()
+        try:
+            self.probes[name]()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)[:200]
+        self.latency[name].append((time.perf_counter() - start) * 1000)
+        self.status[name] = {"ok": ok, "error": error, "checked": time.time()}
+
+    async def _probe(self, name: str):
+        # Atka hua SDK call thread me chalta rahe, par loop uska intezaar nahi karega
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self.run_probe, name), self.timeout)
+        except asyncio.TimeoutError:
+            self.status[name] = {"ok": False, "error": f"timeout after {self.timeout}s", "checked": time.time()}
+
+    async def probe_all(self):
+        # Blocking SDK calls ko threads me, sab providers ek saath
+        await asyncio.gather(*(self._probe(n) for n in self.probes))
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe_all()
+
+    def snapshot(self) -> dict:
+        out = {}
+        for name, samples in self.latency.items():
+            samples = list(samples)
+            out[name] = {
+                **self.status[name],
+                "latency_ms": round(samples[-1], 1) if samples else None,
+                "avg_latency_ms": round(sum(samples) / len(samples), 1) if samples else None,
+            }
+        return out
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """
+        FastAPI(lifespan=prober.lifespan): startup pe warm-up, phir background probing.
+        Warm-up ka intezaar sirf startup_timeout tak - slow provider serving nahi rokta.
+        """
+        warmup = asyncio.create_task(self.probe_all())
+        try:
+            await asyncio.wait_for(asyncio.shield(warmup), self.startup_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Warm-up {self.startup_timeout}s me poora nahi hua, background me chal raha hai.")
+        self._task = asyncio.create_task(self._loop())
+        try:
+            yield
+        finally:
+            warmup.cancel()
+            self._task.cancel()
+
+
+# --- Gemini model list (check_models.py wala logic) ---
+def list_gemini_models(genai) -> list:
+    """Sirf wo models jo Chat/Content Generation karte hain."""
+    return [m.name for m in genai.list_models() if 'generateContent' in m.supported_generation_methods]